@@ -1,6 +1,6 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
 from app.models.schemas import AnalyzeRequest, AnalyzeResponse
-from app.services.analysis_service import analyze_results
+from app.services.analysis_service import analyze_results, analyze_results_stream
 
 router = APIRouter(tags=["analysis"])
 
@@ -14,4 +14,20 @@ async def analyze_results_endpoint(payload: AnalyzeRequest):
         result = await analyze_results(payload)
         return result
     except Exception as exc:
-        raise HTTPException(status_code=500, detail=str(exc))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(exc))
+
+
+@router.post("/analyze_results/stream", response_model=AnalyzeResponse)
+async def analyze_results_stream_endpoint(request: Request):
+    """
+    Same as /analyze_results, but the body is NDJSON (application/x-ndjson):
+    an optional first line {"meta": {query, sql, columns, ...}} followed by one row object per line.
+    The body is consumed incrementally; memory is bounded by ANALYSIS_MAX_ROWS.
+    """
+    try:
+        return await analyze_results_stream(request.stream())
+    except ValueError as exc:
+        # Malformed NDJSON lines or meta fields
+        raise HTTPException(status_code=400, detail=str(exc))
+    except Exception as exc:
+        raise HTTPException(status_code=500, detail=str(exc))
@@ -10,7 +10,6 @@ async def explain_sql_endpoint(payload: ExplainSQLRequest):
     Explain a SQL query in plain English.
     """
     try:
-        explanation = await explain_sql(payload.sql)
-        return ExplainSQLResponse(explanation=explanation)
+        return await explain_sql(payload.sql)
     except Exception as exc:
         raise HTTPException(status_code=500, detail=str(exc))
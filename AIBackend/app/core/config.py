@@ -3,6 +3,8 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+_REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
 class Config:
     OLLAMA_BASE_URL: str = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
     SQL_MODEL: str = os.getenv("SQL_MODEL", "sqlcoder:7b")
@@ -11,5 +13,16 @@ class Config:
     CORE_METADATA_URL: str | None = os.getenv("CORE_METADATA_URL", None)
     PORT: int = int(os.getenv("PORT", "8001"))
     AI_REQUEST_TIMEOUT_SECONDS: int = int(os.getenv("AI_REQUEST_TIMEOUT_SECONDS", "60"))
+    ANALYSIS_CACHE_MAX_ENTRIES: int = int(os.getenv("ANALYSIS_CACHE_MAX_ENTRIES", "256"))
+    ANALYSIS_DELTA_MAX_ROWS: int = int(os.getenv("ANALYSIS_DELTA_MAX_ROWS", "50000"))
+    # Extra Ollama hosts for speculative SQL generation, comma separated
+    SQL_EXTRA_BACKEND_URLS: list[str] = [u.strip() for u in os.getenv("SQL_EXTRA_BACKEND_URLS", "").split(",") if u.strip()]
+    SPECULATIVE_MAX_CANDIDATES: int = int(os.getenv("SPECULATIVE_MAX_CANDIDATES", "3"))
+    PROMPTS_DIR: str = os.getenv("PROMPTS_DIR", os.path.join(_REPO_ROOT, "prompts"))
+    PROMPT_RELOAD_INTERVAL_SECONDS: float = float(os.getenv("PROMPT_RELOAD_INTERVAL_SECONDS", "2"))
+    # Streamed analysis payloads: rows kept in the reservoir sample and max bytes per NDJSON line
+    ANALYSIS_MAX_ROWS: int = int(os.getenv("ANALYSIS_MAX_ROWS", "1000"))
+    ANALYSIS_MAX_LINE_BYTES: int = int(os.getenv("ANALYSIS_MAX_LINE_BYTES", str(1024 * 1024)))
+    ROLLING_STORE_PATH: str = os.getenv("ROLLING_STORE_PATH", os.path.join(_REPO_ROOT, "data", "rolling_aggregates.sqlite3"))
 
 config = Config()
@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+_CLOSERS = {"{": "}", "[": "]"}
+_DECODER = json.JSONDecoder()
+
+
+class IncrementalJSONParser:
+    """
+    Tolerant, incremental parser for JSON objects emitted by an LLM.
+
+    Text is fed in chunks (e.g. streamed tokens); the scanner state (string /
+    escape flags, open containers, safe cut points) is carried between calls so
+    each character is scanned once. `result()` returns the best-effort object:
+    leading prose and code fences are skipped, trailing text after the object
+    is ignored, and truncated output is repaired by closing open strings and
+    containers (or cutting back to the last complete member).
+    """
+
+    def __init__(self) -> None:
+        self._text = ""
+        self._start = -1           # index of the opening '{'
+        self._end = -1             # index just past the matching '}'
+        self._in_string = False
+        self._escape = False
+        self._stack: List[str] = []
+        # (cut index, open containers) after the last complete member
+        self._checkpoint: Optional[Tuple[int, Tuple[str, ...]]] = None
+        self._pos = 0
+
+    @property
+    def complete(self) -> bool:
+        return self._end != -1
+
+    def feed(self, chunk: str) -> None:
+        if not chunk or self.complete:
+            return
+        self._text += chunk
+        self._scan()
+
+    def _scan(self) -> None:
+        text = self._text
+        i = self._pos
+        n = len(text)
+        while i < n:
+            if self._start == -1:
+                i = text.find("{", i)
+                if i == -1:
+                    break
+                self._start = i
+            ch = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch in _CLOSERS:
+                self._stack.append(ch)
+            elif ch in "}]":
+                if self._stack:
+                    self._stack.pop()
+                if not self._stack:
+                    if self._is_object(self._start, i + 1):
+                        self._end = i + 1
+                        self._pos = i + 1
+                        return
+                    # Braces in leading prose ("Result {see below}: {...}"): try the next '{'
+                    i = self._restart()
+                    continue
+                self._checkpoint = (i + 1, tuple(self._stack))
+            elif ch == ",":
+                self._checkpoint = (i, tuple(self._stack))
+            i += 1
+        self._pos = n
+
+    def _is_object(self, start: int, end: int) -> bool:
+        try:
+            obj, stop = _DECODER.raw_decode(self._text, start)
+        except json.JSONDecodeError:
+            return False
+        return stop == end and isinstance(obj, dict)
+
+    def _restart(self) -> int:
+        """Drops the current candidate span; scanning resumes just after its '{'."""
+        resume = self._start + 1
+        self._start = -1
+        self._in_string = False
+        self._escape = False
+        self._stack = []
+        self._checkpoint = None
+        return resume
+
+    def result(self) -> Optional[Dict[str, Any]]:
+        """Best-effort parse of what has been fed so far; None if nothing usable."""
+        if self._start == -1:
+            return None
+        if self.complete:
+            obj, _ = _DECODER.raw_decode(self._text, self._start)
+            return obj
+
+        obj = self._repair()
+        if obj is not None:
+            return obj
+        # The open span may start at a brace in prose; look for a later object
+        nxt = self._text.find("{", self._start + 1)
+        while nxt != -1:
+            parser = IncrementalJSONParser()
+            parser._text = self._text[nxt:]
+            parser._scan()
+            if parser.complete:
+                return parser.result()
+            obj = parser._repair()
+            if obj is not None:
+                return obj
+            nxt = self._text.find("{", nxt + 1)
+        # A bare "{" still yields {}
+        return {}
+
+    def _repair(self) -> Optional[Dict[str, Any]]:
+        for candidate in self._repair_candidates():
+            try:
+                obj = json.loads(candidate)
+            except json.JSONDecodeError:
+                continue
+            if isinstance(obj, dict):
+                return obj
+        return None
+
+    def _repair_candidates(self) -> List[str]:
+        text = self._text
+        stop = self._end if self.complete else len(text)
+        body = text[self._start:stop]
+        stack = list(self._stack)
+        candidates: List[str] = []
+
+        # 1. Keep everything, closing a dangling string, key or trailing comma
+        tail = body + ('"' if self._in_string and not self._escape else "")
+        tail = tail.rstrip()
+        if tail.endswith(":"):
+            tail += " null"
+        tail = tail.rstrip(",")
+        candidates.append(tail + _close(stack))
+
+        # 2. Cut back to the last complete member
+        if self._checkpoint is not None:
+            cut, cut_stack = self._checkpoint
+            candidates.append(text[self._start:cut].rstrip().rstrip(",") + _close(list(cut_stack)))
+        return candidates
+
+
+def _close(stack: List[str]) -> str:
+    return "".join(_CLOSERS[c] for c in reversed(stack))
+
+
+def parse_json_object(text: str) -> Optional[Dict[str, Any]]:
+    """
+    One-shot tolerant parse of the first JSON object in `text`.
+    Returns None if no object could be recovered.
+    """
+    parser = IncrementalJSONParser()
+    parser.feed(text)
+    return parser.result()
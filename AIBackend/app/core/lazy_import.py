@@ -0,0 +1,31 @@
+import importlib
+from types import ModuleType
+from typing import Any
+
+
+class LazyModule:
+    """
+    Module proxy that defers the real import until the first attribute access.
+    Keeps heavy dependencies (httpx today; numpy/tokenizers later) off the
+    cold-start path of `import app.main`.
+    """
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module: ModuleType | None = None
+
+    def _load(self) -> ModuleType:
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(self._load(), attr)
+
+    def __repr__(self) -> str:
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<LazyModule {self._name!r} ({state})>"
+
+
+def lazy_import(name: str) -> LazyModule:
+    return LazyModule(name)
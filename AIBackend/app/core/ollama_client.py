@@ -1,6 +1,14 @@
+import json
+import logging
 from typing import Any
-import httpx
 from app.core.config import config
+from app.core.json_repair import IncrementalJSONParser
+from app.core.lazy_import import lazy_import
+
+# httpx is only needed once a request is actually sent to Ollama
+httpx = lazy_import("httpx")
+
+logger = logging.getLogger(__name__)
 
 class OllamaClient:
     """
@@ -11,7 +19,21 @@ class OllamaClient:
     def __init__(self, base_url: str | None = None):
         self.base_url = (base_url or config.OLLAMA_BASE_URL).rstrip("/") + "/api/generate"
 
-    async def generate(self, model: str, prompt: str, timeout: int | float = None) -> str:
+    async def generate(
+        self,
+        model: str,
+        prompt: str,
+        timeout: int | float = None,
+        format: str | dict[str, Any] | None = None,
+        options: dict[str, Any] | None = None,
+    ) -> str:
+        """
+        `format` is passed through to Ollama: "json" or a JSON schema dict
+        constrains decoding so the response is valid JSON of that shape.
+        `options` overrides the deterministic sampling defaults (temperature, seed).
+        With a `format`, the response is streamed and reading stops as soon as
+        the JSON object is complete (see `_stream_json`).
+        """
         timeout = timeout or config.AI_REQUEST_TIMEOUT_SECONDS
         payload: dict[str, Any] = {
             "model": model,
@@ -23,6 +45,11 @@ class OllamaClient:
                 "seed": 42  # Optional: Fixed seed helps even more
             }
         }
+        if options:
+            payload["options"].update(options)
+        if format is not None:
+            payload["format"] = format
+            return await self._stream_json(payload, timeout)
         async with httpx.AsyncClient(timeout=timeout) as client:
             resp = await client.post(self.base_url, json=payload)
             resp.raise_for_status()
@@ -37,5 +64,36 @@ class OllamaClient:
                         return first["content"]
             return resp.text
 
+    async def _stream_json(self, payload: dict[str, Any], timeout: int | float) -> str:
+        """
+        Streams Ollama's NDJSON chunks into an IncrementalJSONParser.
+        Constrained decoding can keep emitting whitespace after the object
+        until num_predict, so the stream is closed (cancelling generation) once
+        the object is complete. If the stream breaks after the object started,
+        the partial text is returned for the caller to repair.
+        """
+        parser = IncrementalJSONParser()
+        pieces: list[str] = []
+        async with httpx.AsyncClient(timeout=timeout) as client:
+            try:
+                async with client.stream("POST", self.base_url, json={**payload, "stream": True}) as resp:
+                    resp.raise_for_status()
+                    async for line in resp.aiter_lines():
+                        if not line.strip():
+                            continue
+                        data = json.loads(line)
+                        if data.get("error"):
+                            raise httpx.HTTPError(f"Ollama error: {data['error']}")
+                        piece = data.get("response") or ""
+                        pieces.append(piece)
+                        parser.feed(piece)
+                        if parser.complete or data.get("done"):
+                            break
+            except (httpx.ReadTimeout, httpx.RemoteProtocolError) as e:
+                if parser.result() is None:
+                    raise
+                logger.warning("Ollama stream ended early, returning partial JSON: %s", e)
+        return "".join(pieces)
+
 # singleton
 ollama_client = OllamaClient()
@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import re
+import threading
+import time
+from typing import Dict, List, Tuple
+
+from app.core.config import config
+
+_PLACEHOLDER_RE = re.compile(r"\{\{\s*(\w+)\s*\}\}")
+
+
+class PromptTemplate:
+    """
+    A prompt file compiled into static text segments and named slots.
+    `{{name}}` marks a slot; everything else is copied verbatim (JSON braces included).
+    Rendering copies the preallocated parts list, fills the slots and joins once.
+    """
+
+    def __init__(self, name: str, text: str):
+        self.name = name
+        self.version = hashlib.sha256(text.encode("utf-8")).hexdigest()[:12]
+        self._parts: List[str] = []
+        self._slots: List[Tuple[int, str]] = []
+        pos = 0
+        for m in _PLACEHOLDER_RE.finditer(text):
+            self._parts.append(text[pos:m.start()])
+            self._slots.append((len(self._parts), m.group(1)))
+            self._parts.append("")
+            pos = m.end()
+        self._parts.append(text[pos:])
+        # Text before the first slot is identical on every call, so it can stay in the model's prompt cache
+        self.static_prefix = self._parts[0]
+        self.variables = tuple(dict.fromkeys(v for _, v in self._slots))
+
+    def render(self, **values: str) -> str:
+        parts = self._parts.copy()
+        for index, var in self._slots:
+            try:
+                parts[index] = values[var]
+            except KeyError:
+                raise KeyError(f"Prompt '{self.name}' requires '{var}'") from None
+        return "".join(parts)
+
+
+class PromptRegistry:
+    """
+    Loads `<name>.txt` templates from the prompts directory once and recompiles
+    a template when its file changes (checked at most every `reload_interval` seconds).
+    """
+
+    def __init__(self, directory: str | None = None, reload_interval: float | None = None):
+        self.directory = directory or config.PROMPTS_DIR
+        self.reload_interval = (
+            reload_interval if reload_interval is not None else config.PROMPT_RELOAD_INTERVAL_SECONDS
+        )
+        self._templates: Dict[str, Tuple[PromptTemplate, int, float]] = {}
+        self._lock = threading.Lock()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, f"{name}.txt")
+
+    def get(self, name: str) -> PromptTemplate:
+        now = time.monotonic()
+        entry = self._templates.get(name)
+        if entry is not None and now - entry[2] < self.reload_interval:
+            return entry[0]
+
+        path = self._path(name)
+        mtime = os.stat(path).st_mtime_ns
+        if entry is not None and entry[1] == mtime:
+            self._templates[name] = (entry[0], mtime, now)
+            return entry[0]
+
+        with self._lock:
+            with open(path, encoding="utf-8") as f:
+                # Editors add a final newline; the template ends where its text ends
+                text = f.read().rstrip("\n")
+            template = PromptTemplate(name, text)
+            self._templates[name] = (template, mtime, now)
+        return template
+
+
+# singleton
+prompt_registry = PromptRegistry()
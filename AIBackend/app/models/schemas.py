@@ -81,6 +81,10 @@ class SQLGenRequest(BaseModel):
     job_id: Optional[str] = Field(
         default=None, description="Optional job id for tracing."
     )
+    speculative: bool = Field(
+        default=False,
+        description="Generate several candidates concurrently and return the first that passes validation.",
+    )
 
 
 class SQLGenResponse(BaseModel):
@@ -93,6 +97,10 @@ class SQLGenResponse(BaseModel):
         default=None,
         description="Any warnings about the generated SQL (e.g., missing filters).",
     )
+    prompt_version: Optional[str] = Field(
+        default=None,
+        description="Hash of the prompt template that produced this response.",
+    )
 
 
 # --------- SQL explanation models --------- #
@@ -111,6 +119,10 @@ class ExplainSQLResponse(BaseModel):
         default=None,
         description="Optional bullet-point breakdown of important behaviors.",
     )
+    prompt_version: Optional[str] = Field(
+        default=None,
+        description="Hash of the prompt template that produced this response.",
+    )
 
 
 # --------- Result analysis models --------- #
@@ -139,6 +151,16 @@ class AnalyzeRequest(BaseModel):
         default=None,
         description="Optional RAG metadata context.",
     )
+    delta: bool = Field(
+        default=False,
+        description="If a previous analysis of the same query exists, send only the changed rows plus its summary.",
+    )
+    window_days: Optional[int] = Field(
+        default=None,
+        ge=1,
+        description="Rolling window length for recurring per-day reports. Keeps per-device per-day stats "
+        "and sends only new days plus a trend/anomaly summary.",
+    )
 
 
 class AnalyzeResponse(BaseModel):
@@ -153,4 +175,8 @@ class AnalyzeResponse(BaseModel):
     recommendations: Optional[List[str]] = Field(
         default=None,
         description="Optional recommended actions or follow-up questions.",
+    )
+    prompt_version: Optional[str] = Field(
+        default=None,
+        description="Hash of the prompt template that produced this response.",
     )
\ No newline at end of file
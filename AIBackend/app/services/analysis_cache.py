@@ -0,0 +1,156 @@
+from __future__ import annotations
+
+import hashlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional
+
+from app.core.config import config
+from app.models.schemas import AnalyzeResponse
+
+_MASK_128 = (1 << 128) - 1
+
+
+def _encode_value(value: Any) -> str:
+    # Type tag keeps 1, 1.0, True and "1" distinct
+    if value is None:
+        return "null"
+    if hasattr(value, "isoformat"):
+        return f"{type(value).__name__}:{value.isoformat()}"
+    return f"{type(value).__name__}:{value!r}"
+
+
+def _row_digest(row: Dict[str, Any]) -> int:
+    h = hashlib.blake2b(digest_size=16)
+    for column in sorted(row):
+        h.update(column.encode("utf-8", "surrogatepass"))
+        h.update(b"\x1f")
+        h.update(_encode_value(row[column]).encode("utf-8", "surrogatepass"))
+        h.update(b"\x1e")
+    return int.from_bytes(h.digest(), "big")
+
+
+@dataclass(frozen=True)
+class RowsFingerprint:
+    """
+    Order-insensitive fingerprint of a result set.
+    `digest` is the sum (mod 2^128) of per-row hashes, so reordering rows does
+    not change it while duplicates still count. `row_digests` is aligned with
+    the input rows and is used to compute deltas; it is None when the rows
+    were streamed past the per-row limit.
+    """
+    digest: int
+    count: int
+    row_digests: Optional[List[int]]
+
+
+class FingerprintBuilder:
+    """Streaming form of `fingerprint_rows`; keeps per-row hashes only up to `keep_row_digests` rows."""
+
+    def __init__(self, keep_row_digests: int | None = None):
+        self._keep = keep_row_digests
+        self._total = 0
+        self._count = 0
+        self._row_digests: Optional[List[int]] = []
+
+    def add(self, row: Dict[str, Any]) -> None:
+        d = _row_digest(row)
+        self._total = (self._total + d) & _MASK_128
+        self._count += 1
+        if self._row_digests is not None:
+            if self._keep is not None and self._count > self._keep:
+                self._row_digests = None
+            else:
+                self._row_digests.append(d)
+
+    def build(self) -> RowsFingerprint:
+        return RowsFingerprint(digest=self._total, count=self._count, row_digests=self._row_digests)
+
+
+def fingerprint_rows(rows: Iterable[Dict[str, Any]]) -> RowsFingerprint:
+    builder = FingerprintBuilder()
+    for row in rows:
+        builder.add(row)
+    return builder.build()
+
+
+def series_key(query: Optional[str], sql: Optional[str], model: str) -> str:
+    """Identifies 'the same question' independent of the rows it returned."""
+    h = hashlib.blake2b(digest_size=16)
+    for part in (model, query or "", sql.strip() if sql else ""):
+        h.update(part.encode("utf-8"))
+        h.update(b"\x1f")
+    return h.hexdigest()
+
+
+def result_key(
+    series: str, fingerprint: RowsFingerprint, prompt_version: str = "", window_days: int | None = None
+) -> str:
+    # The prompt version invalidates exact hits when the template changes;
+    # a windowed analysis answers a different question than a plain one
+    return f"{series}:{prompt_version}:w{window_days or 0}:{fingerprint.count}:{fingerprint.digest:032x}"
+
+
+@dataclass(frozen=True)
+class CachedAnalysis:
+    response: AnalyzeResponse
+    # None when the result set was too large to keep per-row hashes for delta mode
+    row_digests: Optional[FrozenSet[int]]
+
+
+class AnalysisCache:
+    """
+    In-process LRU of AnalyzeResponse objects.
+    - by result key (question + model + prompt version + window + rows fingerprint) for exact hits
+    - by series key (question + model) for the latest analysis, used by delta mode
+    """
+
+    def __init__(self, max_entries: int | None = None, delta_max_rows: int | None = None):
+        self.max_entries = max_entries or config.ANALYSIS_CACHE_MAX_ENTRIES
+        self.delta_max_rows = delta_max_rows if delta_max_rows is not None else config.ANALYSIS_DELTA_MAX_ROWS
+        self._results: OrderedDict[str, AnalyzeResponse] = OrderedDict()
+        self._latest: OrderedDict[str, CachedAnalysis] = OrderedDict()
+
+    def get(self, key: str) -> Optional[AnalyzeResponse]:
+        response = self._results.get(key)
+        if response is None:
+            return None
+        self._results.move_to_end(key)
+        return response.model_copy(deep=True)
+
+    def latest(self, series: str) -> Optional[CachedAnalysis]:
+        entry = self._latest.get(series)
+        if entry is not None:
+            self._latest.move_to_end(series)
+        return entry
+
+    def put(
+        self,
+        series: str,
+        fingerprint: RowsFingerprint,
+        response: AnalyzeResponse,
+        prompt_version: str = "",
+        window_days: int | None = None,
+    ) -> None:
+        stored = response.model_copy(deep=True)
+        key = result_key(series, fingerprint, prompt_version, window_days)
+        self._results[key] = stored
+        self._results.move_to_end(key)
+
+        digests = None
+        if fingerprint.row_digests is not None and fingerprint.count <= self.delta_max_rows:
+            digests = frozenset(fingerprint.row_digests)
+        self._latest[series] = CachedAnalysis(response=stored, row_digests=digests)
+        self._latest.move_to_end(series)
+
+        for store in (self._results, self._latest):
+            while len(store) > self.max_entries:
+                store.popitem(last=False)
+
+    def clear(self) -> None:
+        self._results.clear()
+        self._latest.clear()
+
+
+# singleton
+analysis_cache = AnalysisCache()
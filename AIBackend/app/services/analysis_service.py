@@ -1,17 +1,47 @@
 from __future__ import annotations
 
+import asyncio
 import json
-import re
-import textwrap
-from typing import Any, Dict, List
+import logging
+from typing import Any, AsyncIterable, Dict, List
 
-from httpx import ConnectError, TimeoutException
 from app.core.config import config
-from app.core.ollama_client import ollama_client
+from app.core.json_repair import parse_json_object
+from app.core.ollama_client import httpx, ollama_client
+from app.core.prompt_registry import PromptTemplate, prompt_registry
 from app.models.schemas import AnalyzeRequest, AnalyzeResponse
+from app.services.analysis_cache import analysis_cache, fingerprint_rows, result_key, series_key
+from app.services.rolling_aggregates import DailyAggregator, rolling_store
+from app.services.row_ingest import RowIngestor, ingest_ndjson
 
+logger = logging.getLogger(__name__)
 
-def _format_rows_for_llm(rows: List[Dict[str, Any]], max_rows: int = 30) -> str:
+ANALYSIS_FIELDS: tuple[str, ...] = ("analysis", "anomalies", "recommendations")
+# Rows rendered into the prompt table
+MAX_TABLE_ROWS = 30
+
+
+def _analysis_json_schema(fields: tuple[str, ...] = ANALYSIS_FIELDS) -> Dict[str, Any]:
+    """JSON schema for Ollama's constrained decoding, derived from AnalyzeResponse."""
+    properties: Dict[str, Any] = {}
+    for name in fields:
+        field = AnalyzeResponse.model_fields[name]
+        if field.annotation is str:
+            prop: Dict[str, Any] = {"type": "string"}
+        else:
+            prop = {"type": "array", "items": {"type": "string"}}
+        if field.description:
+            prop["description"] = field.description
+        properties[name] = prop
+    return {"type": "object", "properties": properties, "required": list(fields)}
+
+
+_ANALYSIS_SCHEMA = _analysis_json_schema()
+
+
+def _format_rows_for_llm(
+    rows: List[Dict[str, Any]], max_rows: int = MAX_TABLE_ROWS, total_rows: int | None = None
+) -> str:
     if not rows:
         return "No rows returned."
 
@@ -25,18 +55,156 @@ def _format_rows_for_llm(rows: List[Dict[str, Any]], max_rows: int = 30) -> str:
         values = [str(r.get(c, "")) for c in cols]
         lines.append(" | ".join(values))
 
-    if len(rows) > max_rows:
-        lines.append(f"... ({len(rows) - max_rows} more rows not shown)")
+    total = total_rows if total_rows is not None else len(rows)
+    if total > len(sample):
+        lines.append(f"... ({total - len(sample)} more rows not shown)")
 
     return "\n".join(lines)
 
 
+def _missing_fields(data: Dict[str, Any]) -> List[str]:
+    # An empty anomalies/recommendations list is a valid answer; null or "" is not
+    return [f for f in ANALYSIS_FIELDS if data.get(f) is None or data.get(f) == ""]
+
+
+def _as_str_list(value: Any) -> List[str]:
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return [value]
+    if isinstance(value, list):
+        return [v if isinstance(v, str) else json.dumps(v) for v in value]
+    return [str(value)]
+
+
+async def _reask_missing_fields(prompt: str, partial: Dict[str, Any], missing: List[str]) -> Dict[str, Any]:
+    """
+    One cheap follow-up asking only for the fields the first answer lacked.
+    The original prompt is reused verbatim as prefix so Ollama can reuse its KV cache.
+    """
+    follow_up = (
+        prompt
+        + "\n"
+        + json.dumps(partial)
+        + "\n\n### Follow-up\n"
+        + f"The JSON above is incomplete. Return ONLY a JSON object with the keys: {', '.join(missing)}.\n"
+        + "\n### Response (JSON Only)\n"
+    )
+    try:
+        raw = await ollama_client.generate(
+            model=config.ANALYZE_MODEL,
+            prompt=follow_up,
+            format=_analysis_json_schema(tuple(missing)),
+        )
+    except (httpx.ConnectError, httpx.TimeoutException) as e:
+        logger.warning("Re-ask for missing analysis fields failed: %s", e)
+        return {}
+    data = parse_json_object(raw) or {}
+    return {k: v for k, v in data.items() if k in missing and v not in (None, "")}
+
+
+async def _generate_analysis(prompt: str) -> tuple[AnalyzeResponse, bool]:
+    """Calls the model and parses its answer. The flag is False for fallbacks that must not be cached."""
+    try:
+        raw_response = await ollama_client.generate(
+            model=config.ANALYZE_MODEL, prompt=prompt, format=_ANALYSIS_SCHEMA
+        )
+    except (httpx.ConnectError, httpx.TimeoutException) as e:
+        return AnalyzeResponse(
+            analysis="AI Service Unavailable. Could not analyze results.",
+            anomalies=[],
+            recommendations=[f"Check AI Service connection: {str(e)}"]
+        ), False
+
+    # ------------------------------------------------------------------
+    # JSON PARSING LOGIC (tolerant: fences, trailing text, truncation)
+    # ------------------------------------------------------------------
+    data = parse_json_object(raw_response)
+
+    if not data:
+        # Fallback: Treat whole text as analysis if no JSON could be recovered
+        logger.warning("Analysis returned raw text. Returning as unstructured summary.")
+        return AnalyzeResponse(
+            analysis=raw_response.strip(),
+            anomalies=[],
+            recommendations=["Could not parse specific recommendations."]
+        ), False
+
+    missing = _missing_fields(data)
+    if missing:
+        data.update(await _reask_missing_fields(prompt, data, missing))
+        # Still incomplete (e.g. the re-ask failed): return what we have, but don't cache it
+        missing = _missing_fields(data)
+
+    return AnalyzeResponse(
+        analysis=data.get("analysis") or "No analysis provided.",
+        anomalies=_as_str_list(data.get("anomalies")),
+        recommendations=_as_str_list(data.get("recommendations")),
+    ), not missing
+
+
 async def analyze_results(request: AnalyzeRequest) -> AnalyzeResponse:
     """
     Use llama3.1 to analyze tabular query results and provide capacity insights.
     Returns a structured AnalyzeResponse object.
+
+    Identical results for the same question and model are served from
+    `analysis_cache` without calling the model. With `request.delta`, only the
+    rows that changed since the cached analysis are sent, with its summary.
+    With `request.window_days`, per-day stats are merged into `rolling_store`
+    and only the newest day(s) plus a trend/anomaly summary are sent.
     """
-    table_text = _format_rows_for_llm(request.rows)
+    fingerprint = fingerprint_rows(request.rows)
+    series = series_key(request.query, request.sql, config.ANALYZE_MODEL)
+
+    template = prompt_registry.get("result_analysis_system")
+
+    cached = analysis_cache.get(result_key(series, fingerprint, template.version, request.window_days))
+    if cached is not None:
+        return cached
+
+    rows = request.rows
+    previous_block = ""
+    if request.window_days:
+        # SQLite work runs off the event loop
+        rolling = await asyncio.to_thread(rolling_store.merge, series, request.rows, request.window_days)
+        if rolling is not None:
+            if rolling.had_history:
+                rows = rolling.new_rows
+            previous_block = (
+                "### Rolling Window Summary\n"
+                f"{rolling.summary}\n"
+                + ("Only rows for the newest day(s) are shown below.\n\n" if rolling.had_history else "\n")
+            )
+    elif request.delta:
+        previous = analysis_cache.latest(series)
+        if previous is not None and previous.row_digests is not None:
+            current_digests = set(fingerprint.row_digests)
+            rows = [r for r, d in zip(request.rows, fingerprint.row_digests) if d not in previous.row_digests]
+            removed = len(previous.row_digests - current_digests)
+            previous_block = (
+                "### Previous Analysis\n"
+                f"{previous.response.analysis}\n"
+                f"Since then {len(rows)} rows are new or changed and {removed} rows are no longer present "
+                f"(out of {fingerprint.count} current rows). Only the new or changed rows are shown below; "
+                "update the previous analysis accordingly.\n\n"
+            )
+
+    response, cacheable = await _run_analysis(request, template, rows, previous_block)
+    if cacheable:
+        analysis_cache.put(series, fingerprint, response, template.version, request.window_days)
+    return response
+
+
+async def _run_analysis(
+    request: AnalyzeRequest,
+    template: PromptTemplate,
+    rows: List[Dict[str, Any]],
+    previous_block: str,
+    total_rows: int | None = None,
+) -> tuple[AnalyzeResponse, bool]:
+    """Renders the analysis prompt for `rows` and calls the model."""
+    table_text = _format_rows_for_llm(rows, total_rows=total_rows)
 
     meta_lines: List[str] = []
     if request.query:
@@ -50,68 +218,71 @@ async def analyze_results(request: AnalyzeRequest) -> AnalyzeResponse:
 
     meta_block = "\n".join(meta_lines) if meta_lines else "No extra context."
 
-    # ------------------------------------------------------------------
-    # SYSTEM PROMPT (JSON Enforcement)
-    # ------------------------------------------------------------------
-    prompt = f"""
-You are an expert SRE and Capacity Planner. 
-Analyze the database query results below and provide structured insights.
+    prompt = template.render(meta_block=meta_block, previous_block=previous_block, table_text=table_text)
 
-### Context
-{meta_block}
+    response, cacheable = await _generate_analysis(prompt)
+    response.prompt_version = template.version
+    return response, cacheable
 
-### Data (Tabular)
-{table_text}
 
-### Instructions
-1. **Trend Analysis:** Look strictly at the Date/Month column. Note that data might be sorted DESC (newest first). Don't confuse "top of list" with "start of time".
-2. **Anomalies:** Identify specific resources (Servers, Disks) exceeding safe thresholds (e.g. CPU > 80%, Disk < 10% free).
-3. **Output Format:** You MUST return a valid JSON object.
+async def analyze_results_stream(chunks: AsyncIterable[bytes]) -> AnalyzeResponse:
+    """
+    Analyze an NDJSON payload (optional `{"meta": {...}}` line, then one row per line)
+    without materializing it: rows feed running column aggregates, a reservoir
+    sample, the rows fingerprint and, with `window_days`, the rolling per-day
+    stats. Payloads within ANALYSIS_MAX_ROWS take the regular `analyze_results`
+    path unchanged. Delta mode needs every row, so it is rejected (ValueError)
+    for larger payloads.
+    """
+    ingestor = RowIngestor()
+    request = AnalyzeRequest()
+    series = ""
 
-### JSON Structure
-{{
-  "analysis": "A short executive summary of trends (e.g. 'Memory usage increased by 15% over Q3').",
-  "anomalies": ["List of specific outliers or warnings (e.g. 'SRV-01 CPU spiked to 99% on Oct 12')."],
-  "recommendations": ["2-4 actionable steps (e.g. 'Resize VM', 'Check cron jobs')."]
-}}
+    async def on_meta(meta: Dict[str, Any]) -> None:
+        nonlocal request, series
+        meta.pop("rows", None)
+        request = AnalyzeRequest(**meta)
+        series = series_key(request.query, request.sql, config.ANALYZE_MODEL)
+        if request.window_days:
+            last_day = await asyncio.to_thread(rolling_store.last_day, series)
+            ingestor.daily = DailyAggregator(last_day)
 
-### Response (JSON Only)
-"""
+    await ingest_ndjson(chunks, ingestor, on_meta=on_meta)
+    series = series or series_key(request.query, request.sql, config.ANALYZE_MODEL)
 
-    try:
-        # Call AI
-        raw_response = await ollama_client.generate(model=config.ANALYZE_MODEL, prompt=prompt)
-        
-        # ------------------------------------------------------------------
-        # JSON PARSING LOGIC
-        # ------------------------------------------------------------------
-        cleaned_response = raw_response.strip()
-        
-        # Extract JSON if wrapped in markdown
-        json_match = re.search(r"\{[\s\S]*\}", cleaned_response)
-        if json_match:
-            cleaned_response = json_match.group(0)
-
-        data = json.loads(cleaned_response)
-        
-        return AnalyzeResponse(
-            analysis=data.get("analysis", "No analysis provided."),
-            anomalies=data.get("anomalies", []),
-            recommendations=data.get("recommendations", [])
-        )
+    if not ingestor.truncated:
+        return await analyze_results(request.model_copy(update={"rows": ingestor.sample}))
 
-    except (json.JSONDecodeError, AttributeError):
-        # Fallback: Treat whole text as analysis if JSON fails
-        print("⚠️ Llama 3.1 Analysis returned raw text. Returning as unstructured summary.")
-        return AnalyzeResponse(
-            analysis=raw_response.strip(),
-            anomalies=[],
-            recommendations=["Could not parse specific recommendations."]
+    if request.delta:
+        raise ValueError(
+            f"Delta mode needs the full result set; got {ingestor.total} rows, "
+            f"over ANALYSIS_MAX_ROWS={ingestor.max_rows}. Send without 'delta'."
         )
 
-    except (ConnectError, TimeoutException) as e:
-        return AnalyzeResponse(
-            analysis="AI Service Unavailable. Could not analyze results.",
-            anomalies=[],
-            recommendations=[f"Check AI Service connection: {str(e)}"]
-        )
\ No newline at end of file
+    fingerprint = ingestor.fingerprint()
+    template = prompt_registry.get("result_analysis_system")
+
+    cached = analysis_cache.get(result_key(series, fingerprint, template.version, request.window_days))
+    if cached is not None:
+        return cached
+
+    summary_block = ""
+    if request.window_days and ingestor.daily is not None:
+        rolling = await asyncio.to_thread(rolling_store.apply, series, ingestor.daily, request.window_days)
+        if rolling is not None:
+            summary_block = f"### Rolling Window Summary\n{rolling}\n\n"
+
+    # Draw the table rows from the whole reservoir; the first rows alone would only cover the oldest data
+    shown = ingestor.sample_rows(MAX_TABLE_ROWS)
+    summary_block += (
+        f"### Column Summary (all {ingestor.total} rows)\n"
+        f"{ingestor.column_summary()}\n"
+        f"The table below shows {len(shown)} rows drawn uniformly at random from all {ingestor.total}, "
+        "in their original order.\n\n"
+    )
+    response, cacheable = await _run_analysis(
+        request, template, shown, summary_block, total_rows=ingestor.total
+    )
+    if cacheable:
+        analysis_cache.put(series, fingerprint, response, template.version, request.window_days)
+    return response
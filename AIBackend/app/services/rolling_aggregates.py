@@ -0,0 +1,238 @@
+from __future__ import annotations
+
+import math
+import os
+import sqlite3
+from contextlib import closing
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.config import config
+
+DEVICE_COLUMNS = {"devicename", "device", "servername", "server", "hostname", "host", "instance", "machine"}
+ALL_DEVICES = "*"
+ANOMALY_Z_SCORE = 3.0
+MAX_SUMMARY_LINES = 20
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS daily_stats (
+    series  TEXT NOT NULL,
+    device  TEXT NOT NULL,
+    day     TEXT NOT NULL,
+    metric  TEXT NOT NULL,
+    count   INTEGER NOT NULL,
+    sum     REAL NOT NULL,
+    sum_sq  REAL NOT NULL,
+    min     REAL NOT NULL,
+    max     REAL NOT NULL,
+    PRIMARY KEY (series, device, day, metric)
+)
+"""
+
+_WINDOW_STATS_SQL = """
+SELECT device, metric,
+       SUM(CASE WHEN day = :latest THEN sum END) / SUM(CASE WHEN day = :latest THEN count END),
+       MAX(CASE WHEN day = :latest THEN max END),
+       SUM(CASE WHEN day < :latest THEN count END),
+       SUM(CASE WHEN day < :latest THEN sum END),
+       SUM(CASE WHEN day < :latest THEN sum_sq END),
+       COUNT(*), SUM(x), SUM(y), SUM(x * y), SUM(x * x)
+FROM (
+    SELECT device, metric, day, count, sum, sum_sq, max,
+           julianday(day) - julianday(:start) AS x,
+           sum / count AS y
+    FROM daily_stats
+    WHERE series = :series AND day >= :start
+)
+GROUP BY device, metric
+"""
+
+
+def _as_day(value: Any) -> Optional[str]:
+    if isinstance(value, datetime):
+        return value.date().isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, str) and len(value) >= 10:
+        try:
+            return date.fromisoformat(value[:10]).isoformat()
+        except ValueError:
+            return None
+    return None
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+
+
+@dataclass(frozen=True)
+class DailyShape:
+    day_column: str
+    device_column: Optional[str]
+    metric_columns: List[str]
+
+
+def detect_daily_shape(rows: List[Dict[str, Any]]) -> Optional[DailyShape]:
+    """Finds a per-day date column, an optional device column and numeric metrics from the first row."""
+    if not rows:
+        return None
+    first = rows[0]
+    day_column = next((c for c, v in first.items() if _as_day(v) is not None), None)
+    if day_column is None:
+        return None
+    device_column = next((c for c in first if c.lower() in DEVICE_COLUMNS), None)
+    metric_columns = [c for c, v in first.items() if c not in (day_column, device_column) and _is_number(v)]
+    if not metric_columns:
+        return None
+    return DailyShape(day_column, device_column, metric_columns)
+
+
+@dataclass(frozen=True)
+class RollingSummary:
+    new_rows: List[Dict[str, Any]]
+    summary: str
+    had_history: bool
+
+
+class DailyAggregator:
+    """
+    Folds rows into per-(device, day, metric) stats one at a time, skipping
+    days before `last_day`. Memory grows with devices x days x metrics, not
+    with rows, so it can sit behind a streamed payload.
+    """
+
+    def __init__(self, last_day: Optional[str]):
+        self.last_day = last_day
+        self.shape: Optional[DailyShape] = None
+        self._shape_checked = False
+        self.stats: Dict[Tuple[str, str, str], List[float]] = {}
+
+    def add(self, row: Dict[str, Any]) -> bool:
+        """Returns True if the row belongs to a day that is (re)aggregated."""
+        if not self._shape_checked:
+            self._shape_checked = True
+            self.shape = detect_daily_shape([row])
+        shape = self.shape
+        if shape is None:
+            return False
+        day = _as_day(row.get(shape.day_column))
+        if day is None or (self.last_day is not None and day < self.last_day):
+            return False
+        device = str(row.get(shape.device_column)) if shape.device_column else ALL_DEVICES
+        for metric in shape.metric_columns:
+            v = row.get(metric)
+            if not _is_number(v):
+                continue
+            s = self.stats.get((device, day, metric))
+            if s is None:
+                self.stats[(device, day, metric)] = [1, v, v * v, v, v]
+            else:
+                s[0] += 1
+                s[1] += v
+                s[2] += v * v
+                s[3] = min(s[3], v)
+                s[4] = max(s[4], v)
+        return True
+
+
+class RollingAggregateStore:
+    """
+    SQLite store of per-series, per-device, per-day metric stats
+    (count/sum/sum of squares/min/max).
+
+    Each merge re-aggregates only days at or after the last stored day (the
+    last day may have been partial) and replaces just the (device, day) slices
+    present in the payload, so callers may send only the new day. It then
+    prunes days outside the window and derives trend and anomaly figures
+    from the stored daily stats instead of the raw rows.
+    """
+
+    def __init__(self, path: str | None = None):
+        self.path = path or config.ROLLING_STORE_PATH
+
+    def _connect(self) -> sqlite3.Connection:
+        parent = os.path.dirname(self.path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        conn = sqlite3.connect(self.path)
+        conn.execute(_SCHEMA)
+        return conn
+
+    def last_day(self, series: str) -> Optional[str]:
+        with closing(self._connect()) as conn:
+            (last_day,) = conn.execute("SELECT MAX(day) FROM daily_stats WHERE series = ?", (series,)).fetchone()
+        return last_day
+
+    def merge(self, series: str, rows: List[Dict[str, Any]], window_days: int) -> Optional[RollingSummary]:
+        if detect_daily_shape(rows) is None:
+            return None
+        aggregator = DailyAggregator(self.last_day(series))
+        new_rows = [row for row in rows if aggregator.add(row)]
+        summary = self.apply(series, aggregator, window_days)
+        if summary is None:
+            return None
+        return RollingSummary(new_rows=new_rows, summary=summary, had_history=aggregator.last_day is not None)
+
+    def apply(self, series: str, aggregator: DailyAggregator, window_days: int) -> Optional[str]:
+        """Writes the aggregated slices, prunes the window and returns the change summary."""
+        if aggregator.shape is None:
+            return None
+        stats = aggregator.stats
+        with closing(self._connect()) as conn, conn:
+            # Replace only the (device, day) slices this payload covers; other stored days stay intact
+            conn.executemany(
+                "DELETE FROM daily_stats WHERE series = ? AND device = ? AND day = ?",
+                [(series, dev, day) for dev, day in {(dev, day) for dev, day, _ in stats}],
+            )
+            conn.executemany(
+                "INSERT INTO daily_stats VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(series, dev, day, metric, *s) for (dev, day, metric), s in stats.items()],
+            )
+
+            (latest,) = conn.execute("SELECT MAX(day) FROM daily_stats WHERE series = ?", (series,)).fetchone()
+            if latest is None:
+                return None
+            start = (date.fromisoformat(latest) - timedelta(days=window_days - 1)).isoformat()
+            conn.execute("DELETE FROM daily_stats WHERE series = ? AND day < ?", (series, start))
+
+            window = conn.execute(_WINDOW_STATS_SQL, {"series": series, "latest": latest, "start": start}).fetchall()
+
+        return _format_summary(window, start, latest, window_days)
+
+
+def _format_summary(window: List[tuple], start: str, latest: str, window_days: int) -> str:
+    scored: List[Tuple[float, str]] = []
+    for (device, metric, latest_mean, latest_max, base_n, base_sum, base_sq,
+         n_days, sx, sy, sxy, sxx) in window:
+        parts: List[str] = []
+        z = 0.0
+        if latest_mean is not None:
+            parts.append(f"latest {latest_mean:.2f} (max {latest_max:.2f})")
+        if base_n:
+            base_mean = base_sum / base_n
+            base_std = math.sqrt(max(base_sq / base_n - base_mean * base_mean, 0.0))
+            parts.append(f"window avg {base_mean:.2f}")
+            if latest_mean is not None:
+                if base_mean:
+                    parts.append(f"{(latest_mean - base_mean) / abs(base_mean) * 100:+.1f}%")
+                if base_std > 0:
+                    z = (latest_mean - base_mean) / base_std
+        denom = n_days * sxx - sx * sx
+        if n_days >= 2 and denom > 0:
+            parts.append(f"trend {(n_days * sxy - sx * sy) / denom:+.2f}/day over {n_days} days")
+        if abs(z) >= ANOMALY_Z_SCORE:
+            parts.append(f"ANOMALY z={z:+.1f}")
+        label = metric if device == ALL_DEVICES else f"{device} {metric}"
+        scored.append((abs(z), f"- {label}: " + ", ".join(parts)))
+
+    scored.sort(key=lambda item: item[0], reverse=True)
+    lines = [f"Window {start}..{latest} ({window_days} days). Latest day {latest} vs earlier days in window:"]
+    lines.extend(line for _, line in scored[:MAX_SUMMARY_LINES])
+    if len(scored) > MAX_SUMMARY_LINES:
+        lines.append(f"... ({len(scored) - MAX_SUMMARY_LINES} more series with smaller changes)")
+    return "\n".join(lines)
+
+
+# singleton
+rolling_store = RollingAggregateStore()
@@ -0,0 +1,177 @@
+from __future__ import annotations
+
+import json
+import math
+import random
+from typing import Any, AsyncIterable, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.core.config import config
+from app.services.analysis_cache import FingerprintBuilder, RowsFingerprint
+from app.services.rolling_aggregates import DailyAggregator
+
+MAX_TRACKED_DISTINCT = 50
+
+
+class ColumnStats:
+    """Running aggregate for one column: counts, numeric min/max/mean/std (Welford) and a capped distinct set."""
+
+    __slots__ = ("name", "count", "nulls", "n_numeric", "mean", "m2", "min", "max", "distinct", "distinct_overflow")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.count = 0
+        self.nulls = 0
+        self.n_numeric = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+        self.distinct: Dict[str, None] = {}
+        self.distinct_overflow = False
+
+    def add(self, value: Any) -> None:
+        self.count += 1
+        if value is None:
+            self.nulls += 1
+        elif isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value):
+            self.n_numeric += 1
+            delta = value - self.mean
+            self.mean += delta / self.n_numeric
+            self.m2 += delta * (value - self.mean)
+            self.min = value if self.min is None or value < self.min else self.min
+            self.max = value if self.max is None or value > self.max else self.max
+        elif not self.distinct_overflow:
+            key = str(value)
+            if key not in self.distinct:
+                if len(self.distinct) >= MAX_TRACKED_DISTINCT:
+                    self.distinct_overflow = True
+                else:
+                    self.distinct[key] = None
+
+    def describe(self) -> str:
+        parts = [f"{self.count - self.nulls} values"]
+        if self.nulls:
+            parts.append(f"{self.nulls} nulls")
+        if self.n_numeric:
+            std = math.sqrt(self.m2 / self.n_numeric)
+            parts.append(f"min {self.min:.2f}, max {self.max:.2f}, mean {self.mean:.2f}, std {std:.2f}")
+        if self.distinct:
+            more = "+" if self.distinct_overflow else ""
+            examples = ", ".join(list(self.distinct)[:5])
+            parts.append(f"{len(self.distinct)}{more} distinct (e.g. {examples})")
+        return f"- {self.name}: " + ", ".join(parts)
+
+
+class RowIngestor:
+    """
+    Bounded-memory consumer of result rows.
+    Keeps a uniform reservoir sample of at most `max_rows` rows (Algorithm R),
+    per-column running aggregates, the streaming rows fingerprint and, when
+    `daily` is set, per-day stats for the rolling store; nothing else about a
+    row is retained once it has been added.
+    """
+
+    def __init__(self, max_rows: int | None = None, seed: int = 0):
+        self.max_rows = max_rows or config.ANALYSIS_MAX_ROWS
+        # (arrival index, row), so the sample can be returned in the original order
+        self._sample: List[Tuple[int, Dict[str, Any]]] = []
+        self.columns: Dict[str, ColumnStats] = {}
+        self.total = 0
+        self.daily: Optional[DailyAggregator] = None
+        self._fingerprint = FingerprintBuilder(keep_row_digests=self.max_rows)
+        self._rng = random.Random(seed)
+
+    @property
+    def sample(self) -> List[Dict[str, Any]]:
+        """Sampled rows in arrival order, so trends in sorted results stay readable."""
+        return self.sample_rows()
+
+    def sample_rows(self, k: int | None = None) -> List[Dict[str, Any]]:
+        """
+        At most `k` rows drawn uniformly from the reservoir, in arrival order.
+        Taking the first `k` of `sample` instead would only cover the start of the input.
+        """
+        picked = self._sample
+        if k is not None and len(picked) > k:
+            picked = self._rng.sample(picked, k)
+        return [row for _, row in sorted(picked, key=lambda item: item[0])]
+
+    @property
+    def truncated(self) -> bool:
+        return self.total > self.max_rows
+
+    def add(self, row: Dict[str, Any]) -> None:
+        self.total += 1
+        self._fingerprint.add(row)
+        for name, value in row.items():
+            stats = self.columns.get(name)
+            if stats is None:
+                stats = self.columns[name] = ColumnStats(name)
+            stats.add(value)
+        if self.daily is not None:
+            self.daily.add(row)
+
+        index = self.total - 1
+        if len(self._sample) < self.max_rows:
+            self._sample.append((index, row))
+        else:
+            j = self._rng.randrange(self.total)
+            if j < self.max_rows:
+                self._sample[j] = (index, row)
+
+    def fingerprint(self) -> RowsFingerprint:
+        return self._fingerprint.build()
+
+    def column_summary(self) -> str:
+        return "\n".join(stats.describe() for stats in self.columns.values())
+
+
+async def ingest_ndjson(
+    chunks: AsyncIterable[bytes],
+    ingestor: RowIngestor,
+    on_meta: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None,
+) -> Dict[str, Any]:
+    """
+    Feeds an NDJSON body into `ingestor` as it arrives.
+    An optional first line `{"meta": {...}}` carries the non-row AnalyzeRequest fields and is returned;
+    `on_meta` is awaited with it before any row is added.
+    Raises ValueError on malformed or oversized lines.
+    """
+    meta: Dict[str, Any] = {}
+    pending = b""
+    line_no = 0
+    max_line = config.ANALYSIS_MAX_LINE_BYTES
+
+    def handle(line: bytes) -> bool:
+        """Returns True when the line was the meta header."""
+        nonlocal meta, line_no
+        if len(line) > max_line:
+            raise ValueError(f"NDJSON line exceeds {max_line} bytes")
+        line = line.strip()
+        if not line:
+            return False
+        line_no += 1
+        try:
+            obj = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Invalid JSON on line {line_no}: {e.msg}") from None
+        if not isinstance(obj, dict):
+            raise ValueError(f"Line {line_no} is not a JSON object")
+        if line_no == 1 and set(obj) == {"meta"} and isinstance(obj["meta"], dict):
+            meta = obj["meta"]
+            return True
+        ingestor.add(obj)
+        return False
+
+    async for chunk in chunks:
+        pending += chunk
+        lines = pending.split(b"\n")
+        pending = lines.pop()
+        if len(pending) > max_line:
+            raise ValueError(f"NDJSON line exceeds {max_line} bytes")
+        for line in lines:
+            if handle(line) and on_meta is not None:
+                await on_meta(meta)
+    if handle(pending) and on_meta is not None:
+        await on_meta(meta)
+    return meta
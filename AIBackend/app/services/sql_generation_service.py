@@ -1,14 +1,43 @@
 from __future__ import annotations
 
+import asyncio
+import logging
 import re
-import textwrap
 import json
 from typing import List, Dict, Any, Set
 
-from httpx import ConnectError, TimeoutException
 from app.core.config import config
-from app.core.ollama_client import ollama_client
+from app.core.ollama_client import OllamaClient, httpx, ollama_client
+from app.core.prompt_registry import prompt_registry
 from app.models.schemas import SQLGenRequest, RAGMetadata, SQLGenResponse
+from app.services.sql_validation import validate_sql
+
+logger = logging.getLogger(__name__)
+
+# Patterns compiled once at import instead of on every request
+_DOUBLE_QUOTED_EQ_RE = re.compile(r'=\s*"([^"]*?)"')
+_DOUBLE_QUOTED_IN_RE = re.compile(r'IN\s*\(\s*"([^"]*?)"')
+_CURRENT_DATE_RE = re.compile(r"(?i)\bCURRENT_DATE\b")
+_CURRENT_TIMESTAMP_RE = re.compile(r"(?i)\bCURRENT_TIMESTAMP\b")
+_NOW_RE = re.compile(r"(?i)\bNOW\(\)")
+_INTERVAL_DAYS_RE = re.compile(r"(?i)GETDATE\(\)\s*([+-])\s*interval\s*'(\d+)\s*days?'")
+_LIMIT_RE = re.compile(r"LIMIT\s+(\d+)", re.IGNORECASE)
+_FIRST_SELECT_RE = re.compile(r"(?i)SELECT\s+")
+_NULLS_ORDER_RE = re.compile(r"(?i)\s+NULLS\s+(LAST|FIRST)")
+_DEFAULT_DATEADD_FILTER_RE = re.compile(r"(?i)AND\s+(\w+\.)?DataCollectionDate\s*>=\s*DATEADD\(.*?\)")
+_DEFAULT_GETDATE_FILTER_RE = re.compile(r"(?i)AND\s+(\w+\.)?DataCollectionDate\s*>=\s*GETDATE\(.*?\)")
+_SELECT_TOP_N_RE = re.compile(r"(?i)SELECT\s+TOP\s+\d+\s+")
+_SELECT_OPTIONAL_TOP_RE = re.compile(r"(?i)SELECT\s+(TOP\s+\d+\s+)?")
+_HALLUCINATED_MID_RE = re.compile(r",\s*(?<!\[)\b(Month|Year|Day)\b\s*,", re.IGNORECASE)
+_HALLUCINATED_LAST_RE = re.compile(r",\s*(?<!\[)\b(Month|Year|Day)\b\s+FROM", re.IGNORECASE)
+_HALLUCINATED_FIRST_RE = re.compile(r"SELECT\s+(?<!\[)\b(Month|Year|Day)\b\s*,", re.IGNORECASE)
+_WHERE_RE = re.compile(r"(?i)WHERE\s+")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+_YEAR_RE = re.compile(r"\b(20[2-3]\d)\b")
+_MONTH_RE = re.compile(r"\b(Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[a-z]*\b", re.IGNORECASE)
+_TODAY_RE = re.compile(r"\b(today)\b")
+_LAST_X_MONTHS_RE = re.compile(r"last\s+(\d+)\s+months?\s+(?:of\s+)?(\d{4})")
 
 
 def _get_schema_name(t: Any) -> str:
@@ -116,47 +145,47 @@ def _parse_month_to_num(month_name: str) -> str:
 def _repair_sql(sql: str, nl_question: str, filters: Dict[str, Any] | None = None) -> str:
     """Aggressive Regex pipeline to fix syntax errors."""
     sql = sql.replace("`", "")
-    sql = re.sub(r'=\s*"([^"]*?)"', r"= '\1'", sql)
-    sql = re.sub(r'IN\s*\(\s*"([^"]*?)"', r"IN ('\1'", sql)
+    sql = _DOUBLE_QUOTED_EQ_RE.sub(r"= '\1'", sql)
+    sql = _DOUBLE_QUOTED_IN_RE.sub(r"IN ('\1'", sql)
     
     # Date/Time Normalization
-    sql = re.sub(r"(?i)\bCURRENT_DATE\b", "GETDATE()", sql)
-    sql = re.sub(r"(?i)\bCURRENT_TIMESTAMP\b", "GETDATE()", sql)
-    sql = re.sub(r"(?i)\bNOW\(\)", "GETDATE()", sql)
-    sql = re.sub(r"(?i)GETDATE\(\)\s*([+-])\s*interval\s*'(\d+)\s*days?'", r"DATEADD(DAY, \1\2, GETDATE())", sql)
+    sql = _CURRENT_DATE_RE.sub("GETDATE()", sql)
+    sql = _CURRENT_TIMESTAMP_RE.sub("GETDATE()", sql)
+    sql = _NOW_RE.sub("GETDATE()", sql)
+    sql = _INTERVAL_DAYS_RE.sub(r"DATEADD(DAY, \1\2, GETDATE())", sql)
 
     # Fix Syntax
     if "LIMIT" in sql.upper():
-        match = re.search(r"LIMIT\s+(\d+)", sql, re.IGNORECASE)
+        match = _LIMIT_RE.search(sql)
         if match:
             limit = match.group(1)
-            sql = re.sub(r"LIMIT\s+\d+", "", sql, flags=re.IGNORECASE)
+            sql = _LIMIT_RE.sub("", sql)
             if "TOP" not in sql.upper():
-                sql = re.sub(r"(?i)SELECT\s+", f"SELECT TOP {limit} ", sql, count=1)
+                sql = _FIRST_SELECT_RE.sub(f"SELECT TOP {limit} ", sql, count=1)
 
-    sql = re.sub(r"(?i)\s+NULLS\s+(LAST|FIRST)", "", sql)
+    sql = _NULLS_ORDER_RE.sub("", sql)
     sql = sql.replace(" ilike ", " LIKE ").replace(" ILIKE ", " LIKE ")
 
     # Remove Conflicting Defaults
     if "FORMAT(DataCollectionDate, 'yyyy-MM') IN" in sql:
-        sql = re.sub(r"(?i)AND\s+(\w+\.)?DataCollectionDate\s*>=\s*DATEADD\(.*?\)", "", sql)
-        sql = re.sub(r"(?i)AND\s+(\w+\.)?DataCollectionDate\s*>=\s*GETDATE\(.*?\)", "", sql)
+        sql = _DEFAULT_DATEADD_FILTER_RE.sub("", sql)
+        sql = _DEFAULT_GETDATE_FILTER_RE.sub("", sql)
         sql = sql.replace("WHERE AND", "WHERE").replace("AND AND", "AND")
 
     # Remove Unwanted TOP 1
     ranking_keywords = ['top', 'highest', 'lowest', 'best', 'peak', 'limit']
     if not any(kw in nl_question.lower() for kw in ranking_keywords):
-        sql = re.sub(r"(?i)SELECT\s+TOP\s+\d+\s+", "SELECT ", sql)
+        sql = _SELECT_TOP_N_RE.sub("SELECT ", sql)
 
     # Inject Missing Grouping Columns
     if "GROUP BY FORMAT(DataCollectionDate, 'yyyy-MM')" in sql:
         if "FORMAT(DataCollectionDate, 'yyyy-MM')" not in sql.split("FROM")[0]:
-            sql = re.sub(r"(?i)SELECT\s+(TOP\s+\d+\s+)?", r"SELECT \1FORMAT(DataCollectionDate, 'yyyy-MM') AS [Month], ", sql)
+            sql = _SELECT_OPTIONAL_TOP_RE.sub(r"SELECT \1FORMAT(DataCollectionDate, 'yyyy-MM') AS [Month], ", sql)
 
     # Remove Hallucinated Columns/Aliases from SELECT
-    sql = re.sub(r",\s*(?<!\[)\b(Month|Year|Day)\b\s*,", ",", sql, flags=re.IGNORECASE)
-    sql = re.sub(r",\s*(?<!\[)\b(Month|Year|Day)\b\s+FROM", " FROM", sql, flags=re.IGNORECASE)
-    sql = re.sub(r"SELECT\s+(?<!\[)\b(Month|Year|Day)\b\s*,", "SELECT ", sql, flags=re.IGNORECASE)
+    sql = _HALLUCINATED_MID_RE.sub(",", sql)
+    sql = _HALLUCINATED_LAST_RE.sub(" FROM", sql)
+    sql = _HALLUCINATED_FIRST_RE.sub("SELECT ", sql)
 
     # Filter Injection
     if filters:
@@ -165,7 +194,7 @@ def _repair_sql(sql: str, nl_question: str, filters: Dict[str, Any] | None = Non
                 val_str = f"'{val}'" if isinstance(val, str) else str(val)
                 cond = f"{col} = {val_str}"
                 if "WHERE" in sql.upper():
-                    sql = re.sub(r"(?i)WHERE\s+", f"WHERE {cond} AND ", sql)
+                    sql = _WHERE_RE.sub(f"WHERE {cond} AND ", sql)
                 elif "GROUP BY" in sql.upper():
                     sql = sql.replace("GROUP BY", f"WHERE {cond} GROUP BY")
                 else:
@@ -174,6 +203,96 @@ def _repair_sql(sql: str, nl_question: str, filters: Dict[str, Any] | None = Non
     return sql.rstrip(";")
 
 
+def _postprocess_sql(raw: str, request: SQLGenRequest) -> str:
+    sql = raw.strip()
+    if "```" in sql:
+        parts = sql.split("```")
+        if len(parts) >= 2: sql = parts[1].replace("sql", "", 1).strip()
+
+    if not sql.upper().startswith("SELECT"):
+        sql = "SELECT " + sql
+
+    # Repair & Flatten
+    final_sql = _repair_sql(sql, request.natural_language, request.filters)
+    return _WHITESPACE_RE.sub(' ', final_sql).strip()
+
+
+# Requests currently inside generate_sql; used as queue depth for speculation
+_inflight = 0
+_extra_backends: List[OllamaClient] = []
+
+
+def _sql_backends() -> List[OllamaClient]:
+    if len(_extra_backends) != len(config.SQL_EXTRA_BACKEND_URLS):
+        _extra_backends[:] = [OllamaClient(url) for url in config.SQL_EXTRA_BACKEND_URLS]
+    return [ollama_client, *_extra_backends]
+
+
+def _speculative_candidate_count() -> int:
+    """Full fan-out when idle; each other in-flight request takes one candidate away."""
+    others = max(_inflight - 1, 0)
+    return max(1, config.SPECULATIVE_MAX_CANDIDATES - others)
+
+
+async def _generate_speculative(
+    prompt: str, request: SQLGenRequest, metadata: RAGMetadata | None, prompt_version: str
+) -> SQLGenResponse:
+    """
+    Runs N sampling variants concurrently across the configured backends,
+    validates each as it arrives and returns the first valid one, cancelling the rest.
+    """
+    n = _speculative_candidate_count()
+    backends = _sql_backends()
+
+    async def candidate(i: int) -> tuple[int, str, List[str]]:
+        # Candidate 0 is the usual greedy decode; others sample with rising temperature
+        options = {"temperature": 0.0, "seed": 42} if i == 0 else {"temperature": min(0.2 * i, 0.8), "seed": 42 + i}
+        raw = await backends[i % len(backends)].generate(model=config.SQL_MODEL, prompt=prompt, options=options)
+        sql = _postprocess_sql(raw, request)
+        return i, sql, validate_sql(sql, metadata)
+
+    tasks = [asyncio.create_task(candidate(i)) for i in range(n)]
+    fallback: tuple[int, str, List[str]] | None = None
+    errors: List[str] = []
+    postprocess_failed = False
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            try:
+                i, sql, problems = await next_done
+            except httpx.HTTPError as e:
+                # One failing backend (unreachable, model not pulled, ...) must not sink the others
+                logger.warning("Speculative SQL: candidate failed: %s", e)
+                errors.append(str(e))
+                continue
+            except Exception as e:
+                # e.g. re.error from _repair_sql on unusual filter values
+                logger.warning("Speculative SQL: candidate post-processing failed: %r", e)
+                errors.append(f"Candidate post-processing failed: {e}")
+                postprocess_failed = True
+                continue
+            if not problems:
+                logger.info("Speculative SQL: candidate %d/%d accepted", i + 1, n)
+                return SQLGenResponse(generated_sql=sql, reasoning=None, warnings=[], prompt_version=prompt_version)
+            if fallback is None:
+                fallback = (i, sql, problems)
+    finally:
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    if fallback is None:
+        # The service is only "unavailable" when no backend produced an answer at all
+        reasoning = "Generated SQL could not be post-processed" if postprocess_failed else "AI Service Unavailable"
+        return SQLGenResponse(generated_sql="", reasoning=reasoning, warnings=errors)
+    _, sql, problems = fallback
+    return SQLGenResponse(
+        generated_sql=sql,
+        reasoning=None,
+        warnings=[f"No valid candidate out of {n}."] + problems,
+        prompt_version=prompt_version,
+    )
+
+
 async def generate_sql(request: SQLGenRequest) -> SQLGenResponse:
     # 1. Intelligent Schema Filtering
     filtered_metadata = _filter_metadata_by_query(request.metadata, request.natural_language)
@@ -184,10 +303,10 @@ async def generate_sql(request: SQLGenRequest) -> SQLGenResponse:
 
     # 2. Logic Extraction
     time_hint = ""
-    all_years = re.findall(r"\b(20[2-3]\d)\b", nl_text)
-    all_months = re.findall(r"\b(Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[a-z]*\b", nl_text, re.IGNORECASE)
-    is_today = re.search(r"\b(today)\b", nl_lower)
-    last_x = re.search(r"last\s+(\d+)\s+months?\s+(?:of\s+)?(\d{4})", nl_lower)
+    all_years = _YEAR_RE.findall(nl_text)
+    all_months = _MONTH_RE.findall(nl_text)
+    is_today = _TODAY_RE.search(nl_lower)
+    last_x = _LAST_X_MONTHS_RE.search(nl_lower)
 
     if is_today:
         time_hint = "FILTER RULE: Use `DataCollectionDate >= CAST(GETDATE() AS DATE)`."
@@ -218,54 +337,33 @@ async def generate_sql(request: SQLGenRequest) -> SQLGenResponse:
 
     filter_inst = f"MANDATORY FILTER: {json.dumps(request.filters)}" if request.filters else "MANDATORY FILTER: Filter by DeviceName if mentioned."
 
-    prompt = f"""### Instructions
-Convert the user's question into a valid T-SQL query.
-
-HARD REQUIREMENTS:
-- **Schema:** ONLY use columns from the provided Schema.
-- **No Joins:** Do NOT join tables unless explicitly asked for multiple metrics (e.g. "CPU and Memory").
-- **No Aliases:** Use FULL table names (e.g. `dbo.MemoryPerformance.DataValue`). Do NOT use aliases like `t1` or `mp`.
-- **No CTEs:** Do NOT use `WITH` clauses. Use standard SELECT.
-- **Structure:** SELECT list must match GROUP BY.
-- **Syntax:** Use `TOP n`, `DATEADD`, `GETDATE()`. NO `interval`.
-
-### Schema
-{metadata_block}
-
-### Question
-{request.natural_language}
-
-### Execution Plan
-1. {time_hint}
-2. {grouping_rule}
-3. {agg_hint}
-4. {filter_inst}
-
-### Query
-SELECT"""
+    template = prompt_registry.get("nl_to_sql_system")
+    prompt = template.render(
+        metadata_block=metadata_block,
+        question=request.natural_language,
+        time_hint=time_hint,
+        grouping_rule=grouping_rule,
+        agg_hint=agg_hint,
+        filter_inst=filter_inst,
+    )
 
     # 3. Execution
+    global _inflight
+    _inflight += 1
     try:
-        raw = await ollama_client.generate(model=config.SQL_MODEL, prompt=prompt)
-    except (ConnectError, TimeoutException) as e:
-        return SQLGenResponse(generated_sql="", reasoning="AI Service Unavailable", warnings=[str(e)])
-
-    sql = raw.strip()
-    if "```" in sql:
-        parts = sql.split("```")
-        if len(parts) >= 2: sql = parts[1].replace("sql", "", 1).strip()
-
-    if not sql.upper().startswith("SELECT"):
-        sql = "SELECT " + sql
-
-    # 4. Repair & Flatten
-    final_sql = _repair_sql(sql, request.natural_language, request.filters)
-    
-    # Final Flatten
-    final_sql = re.sub(r'\s+', ' ', final_sql).strip()
-
-    return SQLGenResponse(
-        generated_sql=final_sql,
-        reasoning=None,
-        warnings=[]
-    )
\ No newline at end of file
+        if request.speculative:
+            return await _generate_speculative(prompt, request, filtered_metadata, template.version)
+
+        try:
+            raw = await ollama_client.generate(model=config.SQL_MODEL, prompt=prompt)
+        except (httpx.ConnectError, httpx.TimeoutException) as e:
+            return SQLGenResponse(generated_sql="", reasoning="AI Service Unavailable", warnings=[str(e)])
+
+        return SQLGenResponse(
+            generated_sql=_postprocess_sql(raw, request),
+            reasoning=None,
+            warnings=[],
+            prompt_version=template.version,
+        )
+    finally:
+        _inflight -= 1
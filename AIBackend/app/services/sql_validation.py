@@ -0,0 +1,169 @@
+from __future__ import annotations
+
+import re
+from typing import Dict, List, Set, Tuple
+
+from app.models.schemas import RAGMetadata
+
+# Mirrors worker/src/services/sqlSafety.service.ts so candidates rejected there are rejected here first
+FORBIDDEN_KEYWORDS = [
+    "INSERT", "UPDATE", "DELETE", "MERGE", "ALTER", "DROP", "TRUNCATE", "EXEC", "EXECUTE",
+    "CREATE", "GRANT", "REVOKE", "BACKUP", "RESTORE", "INTO", "PRAGMA", "DBCC", "DENY",
+]
+_FORBIDDEN_RE = re.compile(r"\b(" + "|".join(FORBIDDEN_KEYWORDS) + r")\b", re.IGNORECASE)
+_STRING_LITERAL_RE = re.compile(r"'(?:[^']|'')*'")
+_TABLE_REF_RE = re.compile(r"(?i)\b(?:FROM|JOIN)\s+((?:\[?\w+\]?\.){0,2}\[?\w+\]?)")
+_TOKEN_RE = re.compile(r"\[[^\]]+\]|[A-Za-z_@#][\w@#$]*|\d+(?:\.\d+)?|\S")
+
+# Words that can appear bare in a SELECT without being column references
+_NON_COLUMN_WORDS = {
+    "select", "from", "where", "group", "by", "order", "having", "and", "or", "not", "in", "is", "null",
+    "as", "on", "join", "inner", "left", "right", "full", "outer", "cross", "apply", "top", "distinct",
+    "asc", "desc", "between", "like", "case", "when", "then", "else", "end", "percent", "with", "ties",
+    "union", "all", "exists", "over", "partition", "rows", "range", "preceding", "following", "current",
+    "row", "unbounded", "nolock", "escape", "offset", "fetch", "next", "only", "first",
+    # CAST/CONVERT target types
+    "int", "bigint", "smallint", "tinyint", "float", "real", "decimal", "numeric", "money", "bit",
+    "date", "datetime", "datetime2", "time", "varchar", "nvarchar", "char", "nchar",
+    # DATEADD/DATEPART/DATEDIFF date parts
+    "year", "yy", "yyyy", "quarter", "qq", "q", "month", "mm", "m", "dayofyear", "dy", "y", "day", "dd", "d",
+    "week", "wk", "ww", "weekday", "dw", "hour", "hh", "minute", "mi", "n", "second", "ss", "s",
+    "millisecond", "ms",
+}
+# Tokens after FROM/JOIN <table> that end the table reference instead of naming an alias
+_NOT_ALIAS = {
+    "where", "group", "order", "having", "join", "inner", "left", "right", "full", "cross", "outer",
+    "on", "with", "union", "as", "apply",
+}
+
+
+def _name(token: str) -> str:
+    return token.strip("[]").lower()
+
+
+def _chains(tokens: List[str]) -> List[Tuple[int, List[str]]]:
+    """Groups identifier tokens joined by '.' into (start index, [parts]) chains."""
+    chains: List[Tuple[int, List[str]]] = []
+    i = 0
+    while i < len(tokens):
+        tok = tokens[i]
+        if tok[0].isalpha() or tok[0] in "_[":
+            start, parts = i, [_name(tok)]
+            while i + 2 < len(tokens) and tokens[i + 1] == "." and (tokens[i + 2][0].isalpha() or tokens[i + 2][0] in "_["):
+                parts.append(_name(tokens[i + 2]))
+                i += 2
+            chains.append((start, parts))
+            i += 1
+            continue
+        i += 1
+    return chains
+
+
+def _check_columns(code: str, metadata: RAGMetadata, tables: Set[str]) -> List[str]:
+    """
+    Checks bare, alias-qualified and table-qualified column references against
+    the columns of the tables in FROM/JOIN. Skipped when a referenced table has
+    no column metadata or the query selects from a derived table.
+    """
+    columns_by_table: Dict[str, Set[str]] = {}
+    for c in metadata.columns or []:
+        columns_by_table.setdefault(f"{c.table_schema}.{c.table_name}".lower(), set()).add(c.name.lower())
+
+    tokens = _TOKEN_RE.findall(code)
+    lowered = [t.lower() for t in tokens]
+    chains = _chains(tokens)
+    by_start = {start: parts for start, parts in chains}
+
+    qualifiers: Dict[str, str] = {}     # alias / table name / schema.table -> schema.table
+    table_positions: Set[int] = set()   # token indexes that are part of a table reference or its alias
+    referenced: List[str] = []
+    for idx, tok in enumerate(lowered):
+        if tok not in ("from", "join") or idx + 1 >= len(tokens):
+            continue
+        if tokens[idx + 1] == "(":
+            return []  # derived table: its columns are not in the metadata
+        parts = by_start.get(idx + 1)
+        if parts is None:
+            continue
+        table = ".".join(parts[-2:]) if len(parts) >= 2 else f"dbo.{parts[0]}"
+        if table not in tables or table not in columns_by_table:
+            return []
+        referenced.append(table)
+        qualifiers[table] = table
+        qualifiers[parts[-1]] = table
+        end = idx + 2 * len(parts)
+        table_positions.update(range(idx + 1, end))
+        alias_at = end + 1 if end < len(lowered) and lowered[end] == "as" else end
+        if alias_at < len(tokens) and lowered[alias_at] not in _NOT_ALIAS and tokens[alias_at][0].isalpha():
+            qualifiers[_name(tokens[alias_at])] = table
+            table_positions.add(alias_at)
+    if not referenced:
+        return []
+
+    known = set().union(*(columns_by_table[t] for t in referenced))
+    # Output aliases ("AS [Month]") may be reused in ORDER BY
+    output_aliases = {_name(tokens[i + 1]) for i, t in enumerate(lowered[:-1]) if t == "as"}
+
+    problems: List[str] = []
+    for start, parts in chains:
+        if start in table_positions:
+            continue
+        end = start + 2 * len(parts) - 1
+        if end < len(tokens) and tokens[end] == "(":
+            continue  # function call
+        if start > 0 and lowered[start - 1] == "as":
+            continue
+        column = parts[-1]
+        if len(parts) == 1:
+            if column in _NON_COLUMN_WORDS or column in output_aliases or column in qualifiers:
+                continue
+            if column not in known:
+                problems.append(f"Unknown column: {tokens[start]}.")
+            continue
+        qualifier = ".".join(parts[-3:-1]) if len(parts) >= 3 else parts[0]
+        table = qualifiers.get(qualifier)
+        if table is not None and column not in columns_by_table[table]:
+            problems.append(f"Unknown column: {'.'.join(tokens[start:end:2])}.")
+    return problems
+
+
+def validate_sql(sql: str, metadata: RAGMetadata | None = None) -> List[str]:
+    """
+    Cheap structural checks on a generated query. Returns a list of problems; empty means valid.
+    - parseable: starts with SELECT, has FROM, balanced quotes and parentheses
+    - read-only: no DML/DDL keywords (same list as the worker's safety check)
+    - schema: referenced tables exist in `metadata`, and bare, alias-qualified and
+      table-qualified columns exist in those tables, when column metadata is given
+    """
+    problems: List[str] = []
+    stripped = sql.strip()
+    if not stripped.upper().startswith("SELECT"):
+        problems.append("Query does not start with SELECT.")
+    if stripped.count("'") % 2:
+        problems.append("Unbalanced string quotes.")
+
+    code = _STRING_LITERAL_RE.sub("''", stripped)
+    depth = 0
+    for ch in code:
+        depth += (ch == "(") - (ch == ")")
+        if depth < 0:
+            break
+    if depth != 0:
+        problems.append("Unbalanced parentheses.")
+    if not re.search(r"(?i)\bFROM\b", code):
+        problems.append("Query has no FROM clause.")
+
+    forbidden = sorted({m.upper() for m in _FORBIDDEN_RE.findall(code)})
+    if forbidden:
+        problems.append(f"Forbidden keywords: {', '.join(forbidden)}.")
+
+    if metadata is not None and metadata.tables:
+        tables = {f"{t.schema_name}.{t.name}".lower() for t in metadata.tables}
+        for ref in _TABLE_REF_RE.findall(code):
+            parts = ref.replace("[", "").replace("]", "").lower().split(".")
+            name = ".".join(parts[-2:]) if len(parts) >= 2 else f"dbo.{parts[0]}"
+            if name not in tables:
+                problems.append(f"Unknown table: {ref}.")
+        if metadata.columns:
+            problems.extend(_check_columns(code, metadata, tables))
+    return problems
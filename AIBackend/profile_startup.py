@@ -0,0 +1,66 @@
+"""Profile AIBackend cold start with `python -X importtime`.
+
+Usage:
+    python profile_startup.py                 # top 20 imports by cumulative time
+    python profile_startup.py --top 40
+    python profile_startup.py --budget-ms 1000  # non-zero exit if over budget
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+from typing import List, Tuple
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def run_importtime(target: str) -> Tuple[List[Tuple[int, int, str]], float]:
+    """Import `target` in a fresh interpreter; return (self_us, cumulative_us, module) rows and wall ms."""
+    started = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {target}"],
+        cwd=HERE,
+        capture_output=True,
+        text=True,
+    )
+    wall_ms = (time.perf_counter() - started) * 1000
+    if proc.returncode != 0:
+        sys.stderr.write(proc.stderr)
+        raise SystemExit(proc.returncode)
+
+    rows: List[Tuple[int, int, str]] = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue  # header line
+        rows.append((int(parts[0]), int(parts[1]), parts[2].rstrip()))
+    return rows, wall_ms
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", default="app.main", help="Module to import (default: app.main)")
+    parser.add_argument("--top", type=int, default=20, help="Number of imports to list")
+    parser.add_argument("--budget-ms", type=float, default=None, help="Fail if total import time exceeds this")
+    args = parser.parse_args()
+
+    rows, wall_ms = run_importtime(args.target)
+    target_row = next((r for r in rows if r[2].strip() == args.target), None)
+    total_ms = (target_row[1] if target_row else sum(r[0] for r in rows)) / 1000
+
+    print(f"{args.target}: {total_ms:.1f} ms import, {wall_ms:.1f} ms interpreter wall time")
+    print(f"{'self ms':>9} {'cumul ms':>9}  module")
+    for self_us, cumulative_us, name in sorted(rows, key=lambda r: r[1], reverse=True)[: args.top]:
+        print(f"{self_us / 1000:9.1f} {cumulative_us / 1000:9.1f}  {name}")
+
+    if args.budget_ms is not None and total_ms > args.budget_ms:
+        print(f"Startup budget exceeded: {total_ms:.1f} ms > {args.budget_ms:.1f} ms")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,13 +1,27 @@
+import json
+
+import pytest
 from fastapi.testclient import TestClient
 from app.main import app
 from app.core import ollama_client as ollama_module
+from app.core.config import config
+from app.services import analysis_service
+from app.services.analysis_cache import analysis_cache
+from app.services.rolling_aggregates import RollingAggregateStore
 
 
 client = TestClient(app)
 
 
+@pytest.fixture(autouse=True)
+def clear_analysis_cache():
+    analysis_cache.clear()
+    yield
+    analysis_cache.clear()
+
+
 def test_analyze_results_basic(monkeypatch):
-    async def fake_generate(model: str, prompt: str, timeout=None) -> str:
+    async def fake_generate(model: str, prompt: str, timeout=None, format=None) -> str:
         return "CPU utilization is high on SRV-01. Consider scaling or investigating that host."
 
     monkeypatch.setattr(
@@ -35,3 +49,242 @@ def test_analyze_results_basic(monkeypatch):
     data = resp.json()
     assert "analysis" in data
     assert "srv-01" in data["analysis"].lower()
+
+
+def test_analyze_results_reasks_only_missing_fields(monkeypatch):
+    calls = []
+
+    async def fake_generate(model: str, prompt: str, timeout=None, format=None) -> str:
+        calls.append(format)
+        if len(calls) == 1:
+            # Truncated answer followed by chatter: analysis survives, lists are lost
+            return '```json\n{"analysis": "SRV-01 CPU is saturated.", "anomalies": ["SRV-01 at 92'
+        return '{"recommendations": ["Move batch jobs off SRV-01"]} Hope this helps!'
+
+    monkeypatch.setattr(ollama_module.ollama_client, "generate", fake_generate, raising=True)
+
+    resp = client.post("/v1/analyze_results", json={"rows": [{"DeviceName": "SRV-01", "AvgCpu": 92.5}]})
+    assert resp.status_code == 200
+    data = resp.json()
+    assert data["analysis"] == "SRV-01 CPU is saturated."
+    assert data["anomalies"] == ["SRV-01 at 92"]
+    assert data["recommendations"] == ["Move batch jobs off SRV-01"]
+
+    assert len(calls) == 2
+    assert set(calls[0]["required"]) == {"analysis", "anomalies", "recommendations"}
+    assert calls[1]["required"] == ["recommendations"]
+
+
+def test_analyze_results_does_not_cache_incomplete_answer_after_failed_reask(monkeypatch):
+    calls = []
+
+    async def fake_generate(model: str, prompt: str, timeout=None, format=None) -> str:
+        calls.append(format)
+        if len(calls) % 2 == 0:
+            raise ollama_module.httpx.ConnectError("connection refused")
+        return '{"anomalies": ["SRV-01 at 92'
+
+    monkeypatch.setattr(ollama_module.ollama_client, "generate", fake_generate, raising=True)
+
+    payload = {"rows": [{"DeviceName": "SRV-01", "AvgCpu": 92.5}], "query": "cpu"}
+    resp = client.post("/v1/analyze_results", json=payload)
+    assert resp.status_code == 200
+    assert resp.json()["analysis"] == "No analysis provided."
+    assert len(calls) == 2
+
+    # The degraded answer was not cached: the model is called again
+    client.post("/v1/analyze_results", json=payload)
+    assert len(calls) == 4
+
+
+def test_analyze_results_cache_hit_ignores_row_order(monkeypatch):
+    prompts = []
+
+    async def fake_generate(model: str, prompt: str, timeout=None, format=None) -> str:
+        prompts.append(prompt)
+        return '{"analysis": "SRV-01 is hot.", "anomalies": [], "recommendations": []}'
+
+    monkeypatch.setattr(ollama_module.ollama_client, "generate", fake_generate, raising=True)
+
+    rows = [{"DeviceName": "SRV-01", "AvgCpu": 92.5}, {"DeviceName": "SRV-02", "AvgCpu": 55.2}]
+    first = client.post("/v1/analyze_results", json={"rows": rows, "query": "cpu"})
+    second = client.post("/v1/analyze_results", json={"rows": list(reversed(rows)), "query": "cpu"})
+    assert first.json() == second.json()
+    assert len(prompts) == 1
+
+    # Same values with a different type are a different result set
+    client.post("/v1/analyze_results", json={"rows": [{"DeviceName": "SRV-01", "AvgCpu": "92.5"}], "query": "cpu"})
+    assert len(prompts) == 2
+
+
+def test_analyze_results_delta_mode_sends_only_changed_rows(monkeypatch):
+    prompts = []
+
+    async def fake_generate(model: str, prompt: str, timeout=None, format=None) -> str:
+        prompts.append(prompt)
+        return '{"analysis": "Baseline summary.", "anomalies": [], "recommendations": []}'
+
+    monkeypatch.setattr(ollama_module.ollama_client, "generate", fake_generate, raising=True)
+
+    day1 = [{"Day": "2026-10-01", "DeviceName": "SRV-01", "AvgCpu": 40.0}]
+    day2 = day1 + [{"Day": "2026-10-02", "DeviceName": "SRV-01", "AvgCpu": 97.0}]
+    client.post("/v1/analyze_results", json={"rows": day1, "query": "cpu trend"})
+    resp = client.post("/v1/analyze_results", json={"rows": day2, "query": "cpu trend", "delta": True})
+    assert resp.status_code == 200
+
+    assert len(prompts) == 2
+    assert "Baseline summary." in prompts[1]
+    assert "2026-10-02" in prompts[1]
+    assert "2026-10-01" not in prompts[1]
+
+
+def test_analyze_results_window_days_sends_new_day_and_summary(monkeypatch, tmp_path):
+    prompts = []
+
+    async def fake_generate(model: str, prompt: str, timeout=None, format=None) -> str:
+        prompts.append(prompt)
+        return '{"analysis": "ok", "anomalies": [], "recommendations": []}'
+
+    monkeypatch.setattr(ollama_module.ollama_client, "generate", fake_generate, raising=True)
+    monkeypatch.setattr(analysis_service, "rolling_store", RollingAggregateStore(path=str(tmp_path / "r.sqlite3")))
+
+    old = [{"Day": f"2026-09-{d:02d}", "DeviceName": "SRV-01", "AvgCpu": 40.0} for d in range(1, 11)]
+    new = old[1:] + [{"Day": "2026-09-11", "DeviceName": "SRV-01", "AvgCpu": 45.0}]
+    client.post("/v1/analyze_results", json={"rows": old, "query": "cpu per day", "window_days": 10})
+    resp = client.post("/v1/analyze_results", json={"rows": new, "query": "cpu per day", "window_days": 10})
+    assert resp.status_code == 200
+
+    assert "### Rolling Window Summary" in prompts[1]
+    assert "2026-09-11" in prompts[1]
+    assert "2026-09-05" not in prompts[1]
+
+
+def test_analyze_results_window_days_is_part_of_the_cache_key(monkeypatch, tmp_path):
+    prompts = []
+
+    async def fake_generate(model: str, prompt: str, timeout=None, format=None) -> str:
+        prompts.append(prompt)
+        return '{"analysis": "ok", "anomalies": [], "recommendations": []}'
+
+    store = RollingAggregateStore(path=str(tmp_path / "r.sqlite3"))
+    monkeypatch.setattr(ollama_module.ollama_client, "generate", fake_generate, raising=True)
+    monkeypatch.setattr(analysis_service, "rolling_store", store)
+
+    rows = [{"Day": f"2026-09-{d:02d}", "DeviceName": "SRV-01", "AvgCpu": 40.0} for d in range(1, 6)]
+    client.post("/v1/analyze_results", json={"rows": rows, "query": "cpu per day"})
+    resp = client.post("/v1/analyze_results", json={"rows": rows, "query": "cpu per day", "window_days": 10})
+    assert resp.status_code == 200
+
+    # Not served from the plain analysis: the store is seeded and the prompt has the window summary
+    assert len(prompts) == 2
+    assert "### Rolling Window Summary" in prompts[1]
+    assert store.last_day(analysis_service.series_key("cpu per day", None, config.ANALYZE_MODEL)) == "2026-09-05"
+
+
+def _ndjson(meta, rows):
+    return "\n".join([json.dumps({"meta": meta})] + [json.dumps(r) for r in rows]).encode()
+
+
+def test_analyze_results_stream_samples_large_payloads(monkeypatch):
+    prompts = []
+
+    async def fake_generate(model: str, prompt: str, timeout=None, format=None) -> str:
+        prompts.append(prompt)
+        return '{"analysis": "ok", "anomalies": [], "recommendations": []}'
+
+    monkeypatch.setattr(ollama_module.ollama_client, "generate", fake_generate, raising=True)
+    monkeypatch.setattr(config, "ANALYSIS_MAX_ROWS", 10)
+
+    rows = [{"DeviceName": f"SRV-{i % 4}", "AvgCpu": float(i)} for i in range(500)]
+    headers = {"Content-Type": "application/x-ndjson"}
+    resp = client.post("/v1/analyze_results/stream", content=_ndjson({"query": "cpu"}, rows), headers=headers)
+    assert resp.status_code == 200
+    assert resp.json()["analysis"] == "ok"
+
+    assert "### Column Summary (all 500 rows)" in prompts[0]
+    assert "min 0.00, max 499.00, mean 249.50" in prompts[0]
+    assert "... (490 more rows not shown)" in prompts[0]
+
+    # Same rows in another order: served from the fingerprint cache
+    resp = client.post(
+        "/v1/analyze_results/stream", content=_ndjson({"query": "cpu"}, rows[::-1]), headers=headers
+    )
+    assert resp.status_code == 200
+    assert len(prompts) == 1
+
+
+def test_analyze_results_stream_shows_rows_from_the_whole_payload(monkeypatch):
+    prompts = []
+
+    async def fake_generate(model: str, prompt: str, timeout=None, format=None) -> str:
+        prompts.append(prompt)
+        return '{"analysis": "ok", "anomalies": [], "recommendations": []}'
+
+    monkeypatch.setattr(ollama_module.ollama_client, "generate", fake_generate, raising=True)
+    # Reservoir larger than the prompt table
+    monkeypatch.setattr(config, "ANALYSIS_MAX_ROWS", 500)
+
+    rows = [{"Seq": i, "AvgCpu": float(i % 100)} for i in range(20000)]
+    resp = client.post("/v1/analyze_results/stream", content=_ndjson({"query": "cpu"}, rows))
+    assert resp.status_code == 200
+
+    prompt = prompts[0]
+    assert "The table below shows 30 rows drawn uniformly at random from all 20000" in prompt
+    assert "... (19970 more rows not shown)" in prompt
+    table = prompt[prompt.index("Seq | AvgCpu"):].splitlines()[2:32]
+    shown = [int(line.split(" | ")[0]) for line in table]
+    assert shown == sorted(shown)
+    # Every quarter of the input is represented, not just its start
+    assert {seq * 4 // len(rows) for seq in shown} == {0, 1, 2, 3}
+
+
+def test_analyze_results_stream_small_payload_matches_regular_endpoint(monkeypatch):
+    prompts = []
+
+    async def fake_generate(model: str, prompt: str, timeout=None, format=None) -> str:
+        prompts.append(prompt)
+        return '{"analysis": "ok", "anomalies": [], "recommendations": []}'
+
+    monkeypatch.setattr(ollama_module.ollama_client, "generate", fake_generate, raising=True)
+
+    rows = [{"DeviceName": "SRV-01", "AvgCpu": 92.5}]
+    client.post("/v1/analyze_results/stream", content=_ndjson({"query": "cpu"}, rows))
+    analysis_cache.clear()
+    client.post("/v1/analyze_results", json={"rows": rows, "query": "cpu"})
+    assert prompts[0] == prompts[1]
+
+    resp = client.post("/v1/analyze_results/stream", content=b'{"a": 1}\nnot json\n')
+    assert resp.status_code == 400
+
+
+def test_analyze_results_stream_applies_window_days_past_row_cap(monkeypatch, tmp_path):
+    prompts = []
+
+    async def fake_generate(model: str, prompt: str, timeout=None, format=None) -> str:
+        prompts.append(prompt)
+        return '{"analysis": "ok", "anomalies": [], "recommendations": []}'
+
+    monkeypatch.setattr(ollama_module.ollama_client, "generate", fake_generate, raising=True)
+    monkeypatch.setattr(config, "ANALYSIS_MAX_ROWS", 5)
+    monkeypatch.setattr(analysis_service, "rolling_store", RollingAggregateStore(path=str(tmp_path / "r.sqlite3")))
+
+    rows = [
+        {"Day": f"2026-09-{d:02d}", "DeviceName": f"SRV-{s}", "AvgCpu": 40.0 + (d == 11) * 5}
+        for d in range(1, 12) for s in range(3)
+    ]
+    meta = {"query": "cpu per day", "window_days": 10}
+    resp = client.post("/v1/analyze_results/stream", content=_ndjson(meta, rows))
+    assert resp.status_code == 200
+
+    assert "### Rolling Window Summary" in prompts[0]
+    assert "Window 2026-09-02..2026-09-11 (10 days)" in prompts[0]
+    assert "### Column Summary (all 33 rows)" in prompts[0]
+
+
+def test_analyze_results_stream_rejects_delta_past_row_cap(monkeypatch):
+    monkeypatch.setattr(config, "ANALYSIS_MAX_ROWS", 5)
+
+    rows = [{"DeviceName": "SRV-01", "AvgCpu": float(i)} for i in range(20)]
+    resp = client.post("/v1/analyze_results/stream", content=_ndjson({"query": "cpu", "delta": True}, rows))
+    assert resp.status_code == 400
+    assert "delta" in resp.json()["detail"]
@@ -27,3 +27,4 @@ def test_explain_sql_basic(monkeypatch):
     data = resp.json()
     assert "explanation" in data
     assert "top 10 servers" in data["explanation"].lower()
+    assert data["prompt_version"]
@@ -1,6 +1,11 @@
+import asyncio
+import re
+
+import httpx
 from fastapi.testclient import TestClient
 from app.main import app
 from app.core import ollama_client as ollama_module
+from app.services import sql_generation_service
 
 
 client = TestClient(app)
@@ -33,3 +38,89 @@ def test_generate_sql_basic(monkeypatch):
     assert "generated_sql" in data
     assert "SELECT" in data["generated_sql"].upper()
     assert "CpuPerformance".lower() in data["generated_sql"].lower()
+
+
+def test_generate_sql_speculative_returns_first_valid_candidate(monkeypatch):
+    cancelled = []
+
+    async def fake_generate(model: str, prompt: str, timeout=None, format=None, options=None) -> str:
+        seed = options["seed"]
+        if seed == 42:
+            # Greedy candidate writes to the database: rejected by validation
+            return "SELECT * INTO #tmp FROM dbo.CpuPerformance"
+        if seed == 43:
+            await asyncio.sleep(0.01)
+            return "SELECT DeviceName, AVG(DataValue) FROM dbo.CpuPerformance GROUP BY DeviceName"
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.append(seed)
+            raise
+        return "SELECT 1 FROM dbo.CpuPerformance"
+
+    monkeypatch.setattr(ollama_module.ollama_client, "generate", fake_generate, raising=True)
+
+    payload = {
+        "natural_language": "Average CPU per server",
+        "speculative": True,
+        "metadata": {
+            "tables": [{"schema": "dbo", "name": "CpuPerformance"}],
+            "columns": [
+                {"table_schema": "dbo", "table_name": "CpuPerformance", "name": "DeviceName"},
+                {"table_schema": "dbo", "table_name": "CpuPerformance", "name": "DataValue"},
+            ],
+        },
+    }
+
+    resp = client.post("/v1/generate_sql", json=payload)
+    assert resp.status_code == 200
+    data = resp.json()
+    assert data["generated_sql"].startswith("SELECT DeviceName, AVG(DataValue)")
+    assert data["warnings"] == []
+    assert cancelled == [44]
+
+
+def test_generate_sql_speculative_survives_failing_backend(monkeypatch):
+    async def fake_generate(model: str, prompt: str, timeout=None, format=None, options=None) -> str:
+        if options["seed"] == 43:
+            # e.g. an extra backend that does not have the model pulled
+            request = httpx.Request("POST", "http://backend-2/api/generate")
+            raise httpx.HTTPStatusError("404 model not found", request=request, response=httpx.Response(404, request=request))
+        if options["seed"] == 42:
+            return "SELECT Bogus FROM dbo.CpuPerformance"
+        return "SELECT DeviceName FROM dbo.CpuPerformance"
+
+    monkeypatch.setattr(ollama_module.ollama_client, "generate", fake_generate, raising=True)
+
+    payload = {
+        "natural_language": "List servers",
+        "speculative": True,
+        "metadata": {
+            "tables": [{"schema": "dbo", "name": "CpuPerformance"}],
+            "columns": [{"table_schema": "dbo", "table_name": "CpuPerformance", "name": "DeviceName"}],
+        },
+    }
+
+    resp = client.post("/v1/generate_sql", json=payload)
+    assert resp.status_code == 200
+    data = resp.json()
+    assert data["generated_sql"] == "SELECT DeviceName FROM dbo.CpuPerformance"
+    assert data["warnings"] == []
+
+
+def test_generate_sql_speculative_reports_post_processing_failures(monkeypatch):
+    async def fake_generate(model: str, prompt: str, timeout=None, format=None, options=None) -> str:
+        return "SELECT DeviceName FROM dbo.CpuPerformance"
+
+    def broken_postprocess(raw, request):
+        raise re.error("bad escape")
+
+    monkeypatch.setattr(ollama_module.ollama_client, "generate", fake_generate, raising=True)
+    monkeypatch.setattr(sql_generation_service, "_postprocess_sql", broken_postprocess)
+
+    resp = client.post("/v1/generate_sql", json={"natural_language": "List servers", "speculative": True})
+    assert resp.status_code == 200
+    data = resp.json()
+    assert data["generated_sql"] == ""
+    assert data["reasoning"] == "Generated SQL could not be post-processed"
+    assert all(w.startswith("Candidate post-processing failed") for w in data["warnings"])
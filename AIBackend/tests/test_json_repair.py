@@ -0,0 +1,69 @@
+import asyncio
+import json
+
+import httpx
+
+from app.core.json_repair import IncrementalJSONParser, parse_json_object
+from app.core.ollama_client import OllamaClient
+
+
+def test_parse_ignores_fences_and_trailing_text():
+    text = '```json\n{"analysis": "ok {x}", "anomalies": []}\n```\nLet me know if {anything} else.'
+    assert parse_json_object(text) == {"analysis": "ok {x}", "anomalies": []}
+
+
+def test_parse_repairs_truncated_output():
+    assert parse_json_object('{"analysis": "CPU is hi') == {"analysis": "CPU is hi"}
+    assert parse_json_object('{"analysis": "x", "anoma') == {"analysis": "x"}
+    assert parse_json_object('{"analysis": "x", "anomalies": ["a", "b') == {"analysis": "x", "anomalies": ["a", "b"]}
+    assert parse_json_object("no json here") is None
+
+
+def test_incremental_parser_exposes_partial_fields():
+    text = '{"analysis": "CPU high", "anomalies": ["SRV-01"], "recommendations": ["Resize"]} trailing'
+    parser = IncrementalJSONParser()
+    seen_analysis_before_end = False
+    for i in range(0, len(text), 5):
+        parser.feed(text[i:i + 5])
+        partial = parser.result()
+        if not parser.complete and partial and partial.get("analysis") == "CPU high":
+            seen_analysis_before_end = True
+    assert seen_analysis_before_end
+    assert parser.complete
+    assert parser.result() == {"analysis": "CPU high", "anomalies": ["SRV-01"], "recommendations": ["Resize"]}
+
+
+def test_parse_skips_braces_in_leading_prose():
+    assert parse_json_object('Result {see below}: {"analysis": "x"}') == {"analysis": "x"}
+    assert parse_json_object('Result {see below}: {"analysis": "trunc') == {"analysis": "trunc"}
+
+    parser = IncrementalJSONParser()
+    for chunk in ('Note {', 'draft}: {"anal', 'ysis": "ok"} tail'):
+        parser.feed(chunk)
+    assert parser.complete
+    assert parser.result() == {"analysis": "ok"}
+
+
+def test_ollama_client_stops_streaming_once_object_is_complete(monkeypatch):
+    pieces = ['{"analysis": "CPU', ' high", "anomalies": []', "}", "\n", "\n", "\n"]
+    sent = []
+
+    async def body():
+        for piece in pieces:
+            sent.append(piece)
+            yield (json.dumps({"response": piece, "done": False}) + "\n").encode()
+        yield b'{"response": "", "done": true}\n'
+
+    def handler(request):
+        assert json.loads(request.content)["stream"] is True
+        return httpx.Response(200, content=body())
+
+    real_client = httpx.AsyncClient
+    monkeypatch.setattr(
+        httpx, "AsyncClient", lambda **kwargs: real_client(transport=httpx.MockTransport(handler), **kwargs)
+    )
+
+    raw = asyncio.run(OllamaClient("http://ollama").generate(model="m", prompt="p", format="json"))
+    assert parse_json_object(raw) == {"analysis": "CPU high", "anomalies": []}
+    # Trailing whitespace after the object is never read
+    assert len(sent) < len(pieces)
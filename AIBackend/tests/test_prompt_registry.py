@@ -0,0 +1,33 @@
+import os
+
+from app.core.prompt_registry import PromptRegistry, prompt_registry
+
+
+def test_template_splits_static_prefix_and_renders_slots(tmp_path):
+    (tmp_path / "greet.txt").write_text('Static {"json": true}\n{{name}} and {{ other }}.\n')
+    template = PromptRegistry(directory=str(tmp_path)).get("greet")
+
+    assert template.static_prefix == 'Static {"json": true}\n'
+    assert template.variables == ("name", "other")
+    assert template.render(name="A", other="B") == 'Static {"json": true}\nA and B.'
+
+
+def test_registry_hot_reloads_changed_file(tmp_path):
+    path = tmp_path / "p.txt"
+    path.write_text("v1 {{x}}")
+    registry = PromptRegistry(directory=str(tmp_path), reload_interval=0)
+    first = registry.get("p")
+    assert registry.get("p") is first
+
+    path.write_text("v2 {{x}}")
+    os.utime(path, ns=(os.stat(path).st_atime_ns, os.stat(path).st_mtime_ns + 1_000_000))
+    second = registry.get("p")
+    assert second.render(x="!") == "v2 !"
+    assert second.version != first.version
+
+
+def test_shipped_prompts_compile():
+    for name in ("nl_to_sql_system", "result_analysis_system", "sql_explanation_system"):
+        template = prompt_registry.get(name)
+        assert template.variables
+        assert len(template.version) == 12
@@ -0,0 +1,48 @@
+from datetime import date, timedelta
+
+from app.services.rolling_aggregates import RollingAggregateStore, detect_daily_shape
+
+
+def _days(start: date, n: int, cpu):
+    return [
+        {"Day": (start + timedelta(days=i)).isoformat(), "DeviceName": "SRV-01", "AvgCpu": cpu(i)}
+        for i in range(n)
+    ]
+
+
+def test_detect_daily_shape():
+    shape = detect_daily_shape([{"DataCollectionDate": "2026-10-01T00:00:00", "DeviceName": "A", "Avg": 1.5, "Note": "x"}])
+    assert shape.day_column == "DataCollectionDate"
+    assert shape.device_column == "DeviceName"
+    assert shape.metric_columns == ["Avg"]
+    assert detect_daily_shape([{"Month": "2026-10", "Avg": 1.0}]) is None
+
+
+def test_merge_only_new_days_and_flags_anomaly(tmp_path):
+    store = RollingAggregateStore(path=str(tmp_path / "rolling.sqlite3"))
+    start = date(2026, 9, 1)
+
+    first = store.merge("s", _days(start, 30, lambda i: 40.0 + (i % 3)), window_days=30)
+    assert not first.had_history
+    assert len(first.new_rows) == 30
+
+    # Next day's report: same 30-day window shifted by one, with a spike on the new day
+    rows = _days(start + timedelta(days=1), 30, lambda i: 99.0 if i == 29 else 40.0 + ((i + 1) % 3))
+    second = store.merge("s", rows, window_days=30)
+    assert second.had_history
+    # Only the previously last (possibly partial) day and the new day are re-read
+    assert [r["Day"] for r in second.new_rows] == ["2026-09-30", "2026-10-01"]
+    assert "SRV-01 AvgCpu" in second.summary
+    assert "ANOMALY" in second.summary
+    assert "Window 2026-09-02..2026-10-01" in second.summary
+
+
+def test_merge_of_single_new_days_keeps_history(tmp_path):
+    store = RollingAggregateStore(path=str(tmp_path / "rolling.sqlite3"))
+    start = date(2026, 10, 1)
+    for i in range(5):
+        summary = store.merge("s", _days(start + timedelta(days=i), 1, lambda _: 40.0 + i), window_days=30)
+
+    assert summary.had_history
+    assert "window avg 41.50" in summary.summary
+    assert "over 5 days" in summary.summary
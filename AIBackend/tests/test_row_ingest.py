@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+
+from app.services.analysis_cache import fingerprint_rows
+from app.services.row_ingest import RowIngestor, ingest_ndjson
+
+
+def test_row_ingestor_bounds_sample_and_keeps_exact_aggregates():
+    rows = [{"DeviceName": f"SRV-{i % 3}", "AvgCpu": float(i)} for i in range(1000)]
+    ingestor = RowIngestor(max_rows=50)
+    for row in rows:
+        ingestor.add(row)
+
+    assert ingestor.total == 1000
+    assert ingestor.truncated
+    assert len(ingestor.sample) == 50
+    cpu = ingestor.columns["AvgCpu"]
+    assert (cpu.min, cpu.max, cpu.mean) == (0.0, 999.0, 499.5)
+    assert list(ingestor.columns["DeviceName"].distinct) == ["SRV-0", "SRV-1", "SRV-2"]
+    # Streaming fingerprint matches the in-memory one, without per-row hashes past the cap
+    fp = ingestor.fingerprint()
+    assert fp.digest == fingerprint_rows(rows).digest
+    assert fp.row_digests is None
+
+
+def test_ingest_ndjson_handles_split_lines_and_meta():
+    body = b'{"meta": {"query": "cpu"}}\n{"a": 1}\n\n{"a": 2}'
+
+    async def chunks():
+        for i in range(0, len(body), 7):
+            yield body[i:i + 7]
+
+    ingestor = RowIngestor(max_rows=10)
+    meta = asyncio.run(ingest_ndjson(chunks(), ingestor))
+    assert meta == {"query": "cpu"}
+    assert ingestor.sample == [{"a": 1}, {"a": 2}]
+
+    async def bad():
+        yield b'{"a": 1}\n[1, 2]\n'
+
+    with pytest.raises(ValueError):
+        asyncio.run(ingest_ndjson(bad(), RowIngestor(max_rows=10)))
+
+
+def test_row_ingestor_sample_keeps_arrival_order():
+    ingestor = RowIngestor(max_rows=20, seed=3)
+    for i in range(500):
+        ingestor.add({"i": i})
+
+    order = [row["i"] for row in ingestor.sample]
+    assert len(order) == 20
+    assert order == sorted(order)
+
+
+def test_ingest_ndjson_rejects_oversized_line_inside_chunk(monkeypatch):
+    from app.core.config import config
+
+    monkeypatch.setattr(config, "ANALYSIS_MAX_LINE_BYTES", 32)
+
+    async def chunks():
+        # The long line is complete within the chunk, so it never becomes the pending tail
+        yield b'{"a": 1}\n{"a": "' + b"x" * 64 + b'"}\n{"a": 2}'
+
+    with pytest.raises(ValueError, match="exceeds 32 bytes"):
+        asyncio.run(ingest_ndjson(chunks(), RowIngestor(max_rows=10)))
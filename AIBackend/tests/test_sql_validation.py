@@ -0,0 +1,37 @@
+from app.models.schemas import RAGMetadata
+from app.services.sql_validation import validate_sql
+
+METADATA = RAGMetadata(
+    tables=[{"schema": "dbo", "name": "CpuPerformance"}],
+    columns=[
+        {"table_schema": "dbo", "table_name": "CpuPerformance", "name": "DeviceName"},
+        {"table_schema": "dbo", "table_name": "CpuPerformance", "name": "DataValue"},
+    ],
+)
+
+
+def test_validate_sql_accepts_read_only_query_on_known_schema():
+    sql = "SELECT dbo.CpuPerformance.DeviceName, AVG(dbo.CpuPerformance.DataValue) FROM AnalyticsDB.dbo.CpuPerformance WHERE DeviceName = 'it''s' GROUP BY dbo.CpuPerformance.DeviceName"
+    assert validate_sql(sql, METADATA) == []
+
+
+def test_validate_sql_rejects_unsafe_or_broken_queries():
+    assert any("Forbidden" in p for p in validate_sql("SELECT * INTO x FROM dbo.CpuPerformance"))
+    assert "Unbalanced parentheses." in validate_sql("SELECT AVG(DataValue FROM dbo.CpuPerformance")
+    assert any("Unknown table" in p for p in validate_sql("SELECT * FROM dbo.DiskPerformance", METADATA))
+    assert any("Unknown column" in p for p in validate_sql("SELECT dbo.CpuPerformance.Foo FROM dbo.CpuPerformance", METADATA))
+    # Keywords inside string literals are data, not statements
+    assert validate_sql("SELECT * FROM dbo.CpuPerformance WHERE DeviceName = 'DROP'") == []
+
+
+def test_validate_sql_checks_bare_and_alias_qualified_columns():
+    assert validate_sql("SELECT c.Bogus, Nope FROM dbo.CpuPerformance c", METADATA) == [
+        "Unknown column: c.Bogus.",
+        "Unknown column: Nope.",
+    ]
+    sql = (
+        "SELECT c.DeviceName, AVG(c.DataValue) AS [Avg] FROM AnalyticsDB.dbo.CpuPerformance AS c "
+        "WHERE c.DataValue >= 0 AND DATEADD(DAY, -7, GETDATE()) < GETDATE() "
+        "GROUP BY c.DeviceName ORDER BY [Avg] DESC"
+    )
+    assert validate_sql(sql, METADATA) == []
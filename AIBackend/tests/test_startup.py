@@ -0,0 +1,17 @@
+import os
+import subprocess
+import sys
+
+AIBACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_app_import_does_not_load_httpx():
+    # httpx is deferred until the first Ollama call to keep cold start short
+    proc = subprocess.run(
+        [sys.executable, "-c", "import sys, app.main; print('httpx' in sys.modules)"],
+        cwd=AIBACKEND_DIR,
+        capture_output=True,
+        text=True,
+    )
+    assert proc.returncode == 0, proc.stderr
+    assert proc.stdout.strip() == "False"
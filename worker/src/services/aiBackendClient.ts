@@ -19,13 +19,27 @@ export async function generateSql(payload: any) {
   return res.data;
 }
 
+// Streams rows as NDJSON (meta line first, then one row per line) so the
+// AIBackend can aggregate and sample them without materializing the whole set
+function toNdjson(payload: AnalyzePayload): string {
+  const { rows, ...meta } = payload;
+  const lines = [JSON.stringify({ meta })];
+  for (const row of rows) {
+    lines.push(JSON.stringify(row));
+  }
+  return lines.join("\n");
+}
+
 // ✅ NEW: Function to call the analysis endpoint
 export async function analyzeResults(payload: AnalyzePayload) {
   try {
     const res = await axios.post(
-      `${config.AI_BACKEND_URL}/v1/analyze_results`,
-      payload,
-      { timeout: 600000 } // Give it time to think (60s)
+      `${config.AI_BACKEND_URL}/v1/analyze_results/stream`,
+      toNdjson(payload),
+      {
+        timeout: 600000, // Give it time to think (60s)
+        headers: { "Content-Type": "application/x-ndjson" }
+      }
     );
     return res.data;
   } catch (error) {